@@ -0,0 +1,35 @@
+"""add processing status to processed_documents
+
+Revision ID: 3b8f2d6e9a41
+Revises: 5e7a1c93b2d8
+Create Date: 2026-10-15 22:18:42.630175
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8f2d6e9a41'
+down_revision: Union[str, None] = '5e7a1c93b2d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 已有记录都是同步转换完成后才写入的，默认状态为completed
+    op.add_column('processed_documents', sa.Column('status', sa.String(length=20), nullable=False, server_default='completed'))
+    op.add_column('processed_documents', sa.Column('error_message', sa.Text(), nullable=True))
+    # 转换在后台进行，记录创建时还没有输出文件
+    op.alter_column('processed_documents', 'file_path', existing_type=sa.String(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM processed_documents WHERE file_path IS NULL")
+    op.alter_column('processed_documents', 'file_path', existing_type=sa.String(), nullable=False)
+    op.drop_column('processed_documents', 'error_message')
+    op.drop_column('processed_documents', 'status')
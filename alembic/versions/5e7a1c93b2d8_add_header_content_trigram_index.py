@@ -0,0 +1,45 @@
+"""add trigram index for header content search
+
+Revision ID: 5e7a1c93b2d8
+Revises: decdd0f14b44
+Create Date: 2026-10-15 22:04:17.215406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a1c93b2d8'
+down_revision: Union[str, None] = 'decdd0f14b44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pg_trgm仅PostgreSQL可用，其他数据库继续使用普通的LIKE扫描
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # 只为标题节点建立索引，使 content ILIKE '%q%' 的标题搜索走索引而不是全表扫描
+    op.create_index(
+        'idx_document_node_header_content_trgm',
+        'document_nodes',
+        ['content'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'content': 'gin_trgm_ops'},
+        postgresql_where=sa.text("node_type = 'HEADER'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('idx_document_node_header_content_trgm', table_name='document_nodes')
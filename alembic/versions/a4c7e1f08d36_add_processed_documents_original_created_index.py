@@ -0,0 +1,34 @@
+"""add processed_documents original_document_id/created_at index
+
+Revision ID: a4c7e1f08d36
+Revises: 3b8f2d6e9a41
+Create Date: 2026-10-15 22:31:05.918342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7e1f08d36'
+down_revision: Union[str, None] = '3b8f2d6e9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 按原始文档列出处理文档时走索引，并直接按创建时间有序读取
+    op.create_index(
+        'idx_processed_doc_original_created',
+        'processed_documents',
+        ['original_document_id', 'created_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_processed_doc_original_created', table_name='processed_documents')
@@ -0,0 +1,43 @@
+"""extend document_nodes processed_document_id/node_type index with position and depth
+
+Revision ID: b91d3f5c7a20
+Revises: a4c7e1f08d36
+Create Date: 2026-10-15 22:38:12.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b91d3f5c7a20'
+down_revision: Union[str, None] = 'a4c7e1f08d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 查找子树终点（position之后第一个depth不超过当前标题的标题）时按position顺序扫描索引，
+    # depth直接从索引中判断；目录查询也可按position有序读取标题节点。
+    # 原(processed_document_id, node_type)索引是新索引的前缀，不再需要
+    op.create_index(
+        'idx_document_node_processed_doc_type_position',
+        'document_nodes',
+        ['processed_document_id', 'node_type', 'position', 'depth'],
+        unique=False,
+    )
+    op.drop_index('idx_document_node_processed_doc_type', table_name='document_nodes')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'idx_document_node_processed_doc_type',
+        'document_nodes',
+        ['processed_document_id', 'node_type'],
+        unique=False,
+    )
+    op.drop_index('idx_document_node_processed_doc_type_position', table_name='document_nodes')
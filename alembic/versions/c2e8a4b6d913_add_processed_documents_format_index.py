@@ -0,0 +1,34 @@
+"""add processed_documents original_document_id/format/created_at index
+
+Revision ID: c2e8a4b6d913
+Revises: b91d3f5c7a20
+Create Date: 2026-10-15 22:44:51.237480
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e8a4b6d913'
+down_revision: Union[str, None] = 'b91d3f5c7a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 查找原始文档某种格式的最新处理文档时，从索引末尾倒序读取，无需排序
+    op.create_index(
+        'idx_processed_doc_original_format_created',
+        'processed_documents',
+        ['original_document_id', 'format', 'created_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_processed_doc_original_format_created', table_name='processed_documents')
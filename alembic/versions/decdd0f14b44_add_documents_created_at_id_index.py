@@ -0,0 +1,34 @@
+"""add documents created_at/id index for keyset pagination
+
+Revision ID: decdd0f14b44
+Revises: 0c44f3fed213
+Create Date: 2026-10-15 09:12:31.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'decdd0f14b44'
+down_revision: Union[str, None] = '0c44f3fed213'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 与列表接口的 (created_at DESC, id DESC) 排序一致，使每页都是一次索引范围扫描
+    op.create_index(
+        'idx_document_created_at_id',
+        'documents',
+        [sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_document_created_at_id', table_name='documents')
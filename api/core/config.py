@@ -1,23 +1,44 @@
-import os
+from functools import lru_cache
 from pathlib import Path
-from pydantic import BaseModel
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-class Settings(BaseModel):
-    """应用配置"""
+# 支持转换为HTML的文件扩展名（小写）；处理端点据此提前拒绝不支持的文件，无需导入docling
+SUPPORTED_FORMATS = frozenset({
+    '.pdf', '.docx', '.doc', '.pptx', '.ppt',
+    '.html', '.htm', '.png', '.jpg', '.jpeg'
+})
+
+class Settings(BaseSettings):
+    """应用配置，环境变量和 .env 文件中的同名配置会覆盖默认值"""
     # 项目名称
     PROJECT_NAME: str = "Evolve file processing API"
     
     # API版本
     API_V1_STR: str = "/api/v1"
     
-    # 数据库URL
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+    # 数据库URL，必须通过环境变量或 .env 文件配置；未配置时启动即失败，不会悄悄使用本地数据库
+    DATABASE_URL: str
+    
+    # 每个工作进程最多占用的数据库连接数，由同步和异步两个连接池平分（PostgreSQL）；
+    # N个uvicorn工作进程最多占用 N × DB_CONNECTIONS_PER_WORKER 个连接，
+    # 应小于PostgreSQL的max_connections（默认100）减去保留连接和迁移等其他客户端所需的连接
+    DB_CONNECTIONS_PER_WORKER: int = Field(20, ge=4)
     
     # 处理文件的存储目录
-    PROCESSED_DIR: str = os.getenv("PROCESSED_DIR", "./storage/processed")
+    PROCESSED_DIR: str = "./storage/processed"
     
     # 上传文件的存储目录
-    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./storage/uploads")
+    UPLOAD_DIR: str = "./storage/uploads"
+    
+    # Docling PDF流水线（版面/OCR/表格模型）使用的计算设备：auto、cpu、cuda 或 mps
+    DOCLING_DEVICE: str = "auto"
+    
+    # 文档转换进程池的工作进程数；每个工作进程各自加载一套docling模型，内存占用随进程数增长
+    CONVERT_POOL_WORKERS: int = Field(2, ge=1)
+    
+    # DOCX转HTML结果缓存最多保留的条目数，超出时删除最久未使用的条目；0表示不缓存
+    MAMMOTH_CACHE_MAX_ENTRIES: int = 256
     
     # 确保目录存在
     def setup_directories(self):
@@ -25,13 +46,15 @@ class Settings(BaseModel):
         Path(self.PROCESSED_DIR).mkdir(parents=True, exist_ok=True)
         Path(self.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
-    model_config = {
-        "env_file": ".env",
-        "case_sensitive": True
-    }
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=True,
+        # .env 中还包含数据库容器等其他服务的配置，忽略未声明的字段
+        extra="ignore",
+    )
 
-# 创建全局设置实例
-settings = Settings()
 
-# 确保目录存在
-settings.setup_directories() 
\ No newline at end of file
+@lru_cache
+def get_settings() -> Settings:
+    """获取全局设置实例，每个进程只读取一次环境变量和 .env 文件"""
+    return Settings()
@@ -0,0 +1,57 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """只把日志记录放入队列，格式化和输出都交给后台监听线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 队列只在进程内使用，无需像默认实现那样提前在调用线程中格式化消息
+        return record
+
+
+def setup_logging(level: int = logging.INFO) -> QueueListener:
+    """
+    配置根日志器：请求线程只负责入队，由后台线程完成格式化和写出
+    
+    Args:
+        level: 根日志器级别
+        
+    Returns:
+        QueueListener: 已启动的监听器，应用关闭时需调用其stop()方法
+    """
+    log_queue = queue.SimpleQueue()
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(log_queue)]
+    root.setLevel(level)
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def setup_worker_logging(level: int = logging.INFO) -> None:
+    """
+    转换进程池的进程初始化函数：工作进程直接写出日志
+    
+    fork出的工作进程会继承父进程的队列处理器，但队列的监听线程不会随之复制，
+    记录只会在队列中堆积而不会输出，因此在工作进程中替换为普通的输出处理器。
+    
+    Args:
+        level: 根日志器级别
+    """
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    
+    root = logging.getLogger()
+    root.handlers = [stream_handler]
+    root.setLevel(level)
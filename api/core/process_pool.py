@@ -0,0 +1,20 @@
+import importlib
+from typing import Any
+
+
+def call_by_path(target: str, *args: Any) -> Any:
+    """
+    在进程池工作进程中按模块路径导入并调用函数
+
+    提交给进程池的是本函数和路径字符串，主进程无需导入目标模块；
+    文档转换模块在导入时会加载docling等较重的依赖，只应在工作进程中导入。
+
+    Args:
+        target: "模块路径:函数名"，例如 "api.services.document_processing_service:convert_document"
+        *args: 传给目标函数的参数
+
+    Returns:
+        Any: 目标函数的返回值
+    """
+    module_name, _, function_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)(*args)
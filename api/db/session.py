@@ -1,20 +1,93 @@
-import os
+from functools import lru_cache
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
 
-load_dotenv()
+from api.core.config import get_settings
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
+# 数据库URL与其他配置一样从环境变量和 .env 文件读取
+DATABASE_URL = get_settings().DATABASE_URL
+database_url = make_url(DATABASE_URL)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 单条语句的最长执行时间（毫秒），避免慢查询长期占用连接
+STATEMENT_TIMEOUT_MS = 30000
+
+# 同步和异步连接池各占每个工作进程连接预算的一半，其中一半常驻，另一半为突发请求时的溢出连接；
+# 两个池合计不超过DB_CONNECTIONS_PER_WORKER（默认20：每个池5个常驻+5个溢出）
+POOL_CONNECTIONS = get_settings().DB_CONNECTIONS_PER_WORKER // 2
+POOL_SIZE = POOL_CONNECTIONS // 2
+POOL_MAX_OVERFLOW = POOL_CONNECTIONS - POOL_SIZE
+
+engine_options = {}
+if database_url.get_backend_name() == "postgresql":
+    engine_options = {
+        # 突发请求时允许临时多开连接，拿不到连接时尽快失败而不是长时间排队
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": 5,
+        # 定期回收连接，并在取出前检测，避免使用已被服务端断开的连接
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "connect_args": {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"},
+    }
+
+engine = create_engine(DATABASE_URL, **engine_options)
+# 提交后不使对象过期，端点在commit之后序列化返回对象时无需再次查询
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# 异步驱动：热点只读端点使用异步会话，不占用线程池中的工作线程
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+async_engine_options = {}
+if database_url.get_backend_name() == "postgresql":
+    async_engine_options = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "connect_args": {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}},
+    }
+
+def get_async_database_url() -> URL:
+    """
+    将DATABASE_URL的驱动替换为对应的异步驱动
+    
+    Raises:
+        ValueError: 数据库后端没有已知的异步驱动
+    """
+    backend = database_url.get_backend_name()
+    async_driver = ASYNC_DRIVERS.get(backend)
+    if async_driver is None:
+        raise ValueError(
+            f"No async driver configured for database backend '{backend}'; "
+            f"supported backends: {', '.join(ASYNC_DRIVERS)}"
+        )
+    return database_url.set(drivername=f"{backend}+{async_driver}")
+
+@lru_cache(maxsize=1)
+def get_async_engine() -> AsyncEngine:
+    """每个进程只创建一个异步引擎（及其连接池），首次使用时创建"""
+    return create_async_engine(get_async_database_url(), **async_engine_options)
+
+@lru_cache(maxsize=1)
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(get_async_engine(), class_=AsyncSession, expire_on_commit=False)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def dispose_engines():
+    """关闭时释放所有连接池中的连接"""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    engine.dispose()
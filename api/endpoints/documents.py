@@ -1,16 +1,135 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Path, Query
-from sqlalchemy.orm import Session
-from typing import Optional
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+from pathlib import PurePath
 
-from api.db.session import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException, Path, Query, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import Literal, Optional
+
+from api.core.config import SUPPORTED_FORMATS
+from api.core.process_pool import call_by_path
+from api.db.session import SessionLocal, get_async_db, get_async_sessionmaker, get_db
 from api import schemas
 from api.services import document_service
-from api.services.document_processing_service import document_processing_service
-from api.services.document_structure_service import document_structure_service
 from api.models.document import Document
+from api.models.processed_document import ProcessingStatus
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+def _stream_with_own_session(render, **kwargs):
+    """
+    在独立的数据库会话中执行流式输出
+    
+    请求级的get_db会话会在响应体开始发送前关闭，流式生成器需要自行管理会话
+    
+    Args:
+        render: 接收db参数并产出bytes的生成函数
+        **kwargs: 传递给render的其他参数
+    """
+    with SessionLocal() as db:
+        yield from render(db=db, **kwargs)
+
+# 单页最多返回的文档数；需要全部文档时使用流式的导出接口
+MAX_PAGE_SIZE = 1000
+
+# 导出时每批从数据库读取的文档数
+EXPORT_BATCH_SIZE = 200
+
+# 列表类GET响应的缓存策略：客户端可复用5秒，过期后凭ETag重新验证
+LIST_CACHE_CONTROL = "private, max-age=5, stale-while-revalidate=30"
+
+_PROCESSED_DOCUMENT_LIST = TypeAdapter(list[schemas.processed_document.ProcessedDocument])
+
+def _list_etag(body: bytes) -> str:
+    """
+    由本页序列化后的JSON计算弱ETag
+    
+    ETag只取决于实际返回的内容，不需要对整张表做聚合；
+    行被删除后主键被复用等情况下内容仍然不同，不会误返回304
+    
+    Args:
+        body: 已序列化的JSON响应体
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """客户端的If-None-Match与当前ETag一致时返回304响应，否则返回None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    return None
+
+def _etag_response(request: Request, body: bytes) -> Response:
+    """
+    返回带ETag和Cache-Control的JSON响应；客户端缓存的内容仍然有效时返回304，不再发送响应体
+    
+    Args:
+        request: 当前请求
+        body: 已序列化的JSON响应体
+    """
+    etag = _list_etag(body)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    return Response(
+        content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL}
+    )
+
+def handle_structure_errors(error_prefix: str):
+    """
+    结构化相关端点的统一异常处理：HTTPException原样抛出，
+    其他异常记录日志（含堆栈）后转换为500响应
+    
+    Args:
+        error_prefix: 错误信息前缀，如"获取文档结构失败"
+    """
+    def decorator(func):
+        def log_and_convert(e: Exception, kwargs: dict) -> HTTPException:
+            params = {k: v for k, v in kwargs.items() if not isinstance(v, Session)}
+            logger.exception("%s: %s", error_prefix, func.__name__, extra={"params": params})
+            return HTTPException(status_code=500, detail=f"{error_prefix}: {str(e)}")
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    raise log_and_convert(e, kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise log_and_convert(e, kwargs)
+        return wrapper
+    return decorator
+
+
+# 允许排序的字段，在导入时解析为列对象，避免每次请求反射 Document 的属性
+_SORT_COLUMNS = {
+    "id": Document.id,
+    "filename": Document.filename,
+    "filesize": Document.filesize,
+    "created_at": Document.created_at,
+}
+
 
 @router.post(
     "/",
@@ -42,48 +161,118 @@ async def upload_document(
 
 @router.get(
     "/",
-    response_model=list[schemas.document.Document],
+    response_model=schemas.document.DocumentPage,
     status_code=200,
     summary="List all documents",
-    description="Retrieve all document records from the database with optional pagination and sorting.",
+    description="Retrieve document records from the database using keyset (cursor) pagination and sorting.",
 )
-def list_documents(
-    skip: int = Query(0, description="Number of records to skip (for pagination)"),
-    limit: int = Query(100, description="Maximum number of records to return"),
+async def list_documents(
+    request: Request,
+    cursor_id: Optional[int] = Query(None, description="ID of the last document on the previous page (keyset cursor)"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of records to return (1-1000)"),
     sort_by: Optional[str] = Query("created_at", description="Field to sort by (id, filename, filesize, created_at)"),
     sort_desc: bool = Query(True, description="Sort in descending order"),
-    db: Session = Depends(get_db),
+    count_mode: Optional[Literal["exact", "estimate"]] = Query(
+        None, description="Include a total count: 'exact' (window count on the page query) or 'estimate' (planner statistics)"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Retrieve all documents from the database with pagination and sorting options.
+    Retrieve documents from the database with keyset pagination and sorting options.
+    Responses carry an ETag; send it back in If-None-Match to get 304 when the page is unchanged.
     
-    - **skip**: Number of records to skip (for pagination)
+    - **cursor_id**: `next_cursor_id` from the previous page; omit for the first page
     - **limit**: Maximum number of records to return
     - **sort_by**: Field to sort by (id, filename, filesize, created_at)
     - **sort_desc**: Sort in descending order if true, ascending if false
+    - **count_mode**: `exact` counts the rows from the cursor onward (the table total on the first page)
+      in the same query; `estimate` returns the cached planner estimate of the table size
     """
-    # 构建查询
-    query = db.query(Document)
-    
-    # 排序
-    if sort_by:
-        # 确保排序字段存在
-        if not hasattr(Document, sort_by):
-            sort_by = "created_at"  # 默认排序字段
-        
-        # 获取排序字段
-        sort_field = getattr(Document, sort_by)
-        
-        # 应用排序方向
-        if sort_desc:
-            query = query.order_by(sort_field.desc())
-        else:
-            query = query.order_by(sort_field)
-    
-    # 应用分页
-    documents = query.offset(skip).limit(limit).all()
+    # 排序字段来自白名单，未知字段回退到 created_at；以 id 作为次序键保证顺序唯一
+    sort_field = _SORT_COLUMNS.get(sort_by, Document.created_at)
+    sort_key = tuple_(sort_field, Document.id)
+
+    # 精确计数通过窗口函数随分页查询一起返回，不再单独执行 SELECT COUNT(*)
+    columns = [Document]
+    if count_mode == "exact":
+        columns.append(func.count().over().label("total"))
+
+    # 异步会话不能在序列化时懒加载关系，processed_documents 需随查询一起加载
+    stmt = select(*columns).options(selectinload(Document.processed_documents))
+    if sort_desc:
+        stmt = stmt.order_by(sort_field.desc(), Document.id.desc())
+    else:
+        stmt = stmt.order_by(sort_field, Document.id)
+
+    # 键集分页：先按主键查出游标行的排序值，再从该行之后继续读取；
+    # 游标行不存在（已被删除或参数错误）时返回400，而不是静默返回空页
+    if cursor_id is not None:
+        cursor_row = (await db.execute(
+            select(sort_field, Document.id).where(Document.id == cursor_id)
+        )).first()
+        if cursor_row is None:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor_id: document {cursor_id} does not exist.")
+        cursor_key = tuple_(*cursor_row)
+        stmt = stmt.where(sort_key < cursor_key if sort_desc else sort_key > cursor_key)
+
+    # 多取一条用于判断是否还有下一页
+    stmt = stmt.limit(limit + 1)
+
+    total = None
+    if count_mode == "exact":
+        rows = (await db.execute(stmt)).all()
+        total = rows[0].total if rows else 0
+        rows = [row.Document for row in rows]
+    else:
+        rows = (await db.execute(stmt)).scalars().all()
+        if count_mode == "estimate":
+            total = await document_service.estimate_document_count(db)
+
+    has_next = len(rows) > limit
+    documents = rows[:limit]
+
+    page = schemas.document.DocumentPage.model_validate(
+        {
+            "items": documents,
+            "has_next": has_next,
+            "next_cursor_id": documents[-1].id if has_next else None,
+            "total": total,
+        },
+        from_attributes=True,
+    )
+    return _etag_response(request, page.model_dump_json().encode())
+
+async def _export_documents_ndjson():
+    """按id顺序分批读取全部文档，每个文档输出为一行JSON；内存占用只与批大小有关"""
+    async with get_async_sessionmaker()() as db:
+        result = await db.stream_scalars(
+            select(Document)
+            .options(selectinload(Document.processed_documents))
+            .order_by(Document.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for documents in result.partitions():
+            yield b"".join(
+                schemas.document.Document.model_validate(document).model_dump_json().encode() + b"\n"
+                for document in documents
+            )
+
+@router.get(
+    "/export",
+    status_code=200,
+    summary="Export all documents",
+    description="Stream every document as newline-delimited JSON (one Document object per line).",
+    response_class=StreamingResponse,
+)
+async def export_documents():
+    """
+    Export all documents as NDJSON, ordered by id.
     
-    return documents
+    Rows are read from the database in batches and written to the response as they arrive,
+    so memory use does not grow with the number of documents.
+    """
+    # 流式响应发送期间请求级会话已关闭，生成器使用独立的会话
+    return StreamingResponse(_export_documents_ndjson(), media_type="application/x-ndjson")
 
 @router.delete(
     "/{document_id}",
@@ -92,6 +281,7 @@ def list_documents(
     description="Delete a document record from the database and its associated file from storage.",
 )
 async def delete_document(
+    background_tasks: BackgroundTasks,
     document_id: int = Path(..., description="The ID of the document to delete"),
     db: Session = Depends(get_db),
 ):
@@ -100,13 +290,13 @@ async def delete_document(
     
     This endpoint will:
     1. Find the document record in the database
-    2. Delete the associated file from storage
-    3. Remove the document record from the database
+    2. Remove the document record from the database
+    3. Delete the associated file from storage after the response is sent
     
     - **document_id**: The ID of the document to delete
     """
-    # 调用服务层的删除方法
-    success = await document_service.delete_document(document_id=document_id, db=db)
+    # 调用服务层的删除方法，物理文件在响应发送后删除
+    success = await document_service.delete_document(document_id=document_id, db=db, background_tasks=background_tasks)
     
     if not success:
         raise HTTPException(status_code=404, detail=f"Document with ID {document_id} not found")
@@ -114,65 +304,96 @@ async def delete_document(
     # 204 No Content 响应不需要返回内容
     return None
 
+# 进程池任务的模块路径，主进程不导入文档转换模块（导入时会加载docling）
+CONVERT_DOCUMENT_TASK = "api.services.document_processing_service:convert_document"
+
+def _call_with_own_session(func, **kwargs):
+    """在独立的数据库会话中调用服务层函数，供后台任务放到线程池中执行"""
+    with SessionLocal() as db:
+        return func(db, **kwargs)
+
+async def _convert_in_background(pool, processed_document_id: int, filepath: str) -> None:
+    """
+    后台任务：在转换进程池中转换文档，完成后更新处理文档记录的状态
+    
+    在事件循环中等待进程池的结果，转换期间不占用线程池中的线程；
+    数据库操作放到线程池中执行。响应已经返回，请求级的数据库会话已关闭，这里使用独立的会话
+    """
+    try:
+        html_output_path, resources_path = await asyncio.wrap_future(
+            pool.submit(call_by_path, CONVERT_DOCUMENT_TASK, filepath)
+        )
+    except Exception as e:
+        logger.exception("Failed to process document: processed_document_id=%s", processed_document_id)
+        await run_in_threadpool(
+            _call_with_own_session,
+            document_service.fail_processed_document,
+            processed_document_id=processed_document_id,
+            error_message=str(e),
+        )
+        return
+
+    await run_in_threadpool(
+        _call_with_own_session,
+        document_service.complete_processed_document,
+        processed_document_id=processed_document_id,
+        file_path=html_output_path,
+        resources_path=resources_path,
+    )
+
 @router.post(
     "/{document_id}/process",
     response_model=schemas.processed_document.ProcessedDocument,
-    status_code=201,
+    status_code=202,
     summary="Process a document and convert to HTML",
-    description="Process an existing document using docling to convert to HTML format with preserved images.",
+    description="Start converting an existing document to HTML with preserved images using docling. "
+                "Returns immediately with a pending processed document; poll GET /processed/{id} for its status.",
 )
 def process_document_to_html(
     *,
+    request: Request,
+    background_tasks: BackgroundTasks,
     document_id: int = Path(..., description="The ID of the document to process."),
     output_format: str = Query("html", description="The desired output format. Currently only 'html' is supported."),
     db: Session = Depends(get_db),
 ):
     """
     处理指定ID的文档，将其转换为HTML格式并保留图片：
-    - 使用document_processing_service统一处理所有文档类型
-    - 转换后的文件及其资源将被保存到处理目录中
+    - 立即创建状态为pending的处理文档记录并返回202
+    - 转换在后台的进程池中执行，完成后记录状态变为completed（失败为failed）
     
     - **document_id**: 要处理的文档ID.
     - **output_format**: 输出格式，目前只支持"html".
     """
-    # 1. 从数据库获取文档
-    document = document_service.get_document(db, document_id=document_id)
-    if not document:
+    # 1. 从数据库获取文档路径（只需要这一列）
+    filepath = document_service.get_document_filepath(db, document_id=document_id)
+    if filepath is None:
         raise HTTPException(status_code=404, detail=f"Document with ID {document_id} not found")
     
     # 检查请求的输出格式
     if output_format.lower() != "html":
         raise HTTPException(status_code=400, detail="Currently only HTML output format is supported")
 
-    # 2. 使用document_processing_service处理文档
-    try:
-        # 使用统一的处理服务处理所有文档类型
-        html_output_path, resources_path = document_processing_service.convert_file(document.filepath)
-        print(f"使用docling处理文档: {document.filepath}")
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        # 捕获可能的错误，提供详细信息以便调试
-        error_message = f"Failed to process document: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
-
-    # 3. 为处理后的文档创建数据库记录
+    # 不支持的文件类型直接拒绝，不创建记录也不占用转换进程
+    file_extension = PurePath(filepath).suffix.lower()
+    if file_extension not in SUPPORTED_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file format: {file_extension or PurePath(filepath).name}")
+
+    # 2. 创建待处理的文档记录
     processed_doc_in = schemas.processed_document.ProcessedDocumentCreate(
         original_document_id=document_id,
-        file_path=html_output_path,
-        resources_path=resources_path,
         format=output_format.lower(),
+        status=ProcessingStatus.PENDING.value,
     )
-
     db_processed_document = document_service.create_processed_document(
         db=db, processed_document_in=processed_doc_in
     )
 
+    # 3. 响应返回后在转换进程池中处理文档
+    background_tasks.add_task(
+        _convert_in_background, request.app.state.convert_pool, db_processed_document.id, filepath
+    )
+
     return db_processed_document
 
 
@@ -184,6 +405,7 @@ def process_document_to_html(
     description="Retrieve all processed document records related to the specified original document.",
 )
 def list_processed_documents(
+    request: Request,
     document_id: int = Path(..., description="The ID of the original document."),
     db: Session = Depends(get_db),
 ):
@@ -193,14 +415,40 @@ def list_processed_documents(
     - **document_id**: 原始文档ID
     """
     # 首先检查原始文档是否存在
-    document = document_service.get_document(db, document_id=document_id)
-    if not document:
+    if not document_service.document_exists(db, document_id=document_id):
         raise HTTPException(status_code=404, detail=f"Document with ID {document_id} not found")
     
     # 获取所有关联的处理过的文档
     processed_documents = document_service.get_processed_documents_by_original_id(db, original_document_id=document_id)
     
-    return processed_documents
+    body = _PROCESSED_DOCUMENT_LIST.dump_json(
+        _PROCESSED_DOCUMENT_LIST.validate_python(processed_documents, from_attributes=True)
+    )
+    # 处理状态变化时内容随之变化；客户端轮询时凭ETag得到304，不再重复传输列表
+    return _etag_response(request, body)
+
+
+@router.get(
+    "/processed/{processed_document_id}",
+    response_model=schemas.processed_document.ProcessedDocument,
+    status_code=200,
+    summary="Get a processed document",
+    description="Retrieve a processed document record, including its conversion status.",
+)
+def get_processed_document(
+    processed_document_id: int = Path(..., description="The ID of the processed document"),
+    db: Session = Depends(get_db),
+):
+    """
+    获取指定ID的处理过的文档，可用于轮询后台转换的状态（pending / completed / failed）。
+    
+    - **processed_document_id**: 处理过的文档ID
+    """
+    processed_document = document_service.get_processed_document(db, processed_document_id=processed_document_id)
+    if not processed_document:
+        raise HTTPException(status_code=404, detail=f"Processed document with ID {processed_document_id} not found")
+    
+    return processed_document
 
 
 @router.delete(
@@ -210,6 +458,7 @@ def list_processed_documents(
     description="Delete a processed document record from the database and its associated file from storage.",
 )
 async def delete_processed_document(
+    background_tasks: BackgroundTasks,
     processed_document_id: int = Path(..., description="The ID of the processed document to delete"),
     db: Session = Depends(get_db),
 ):
@@ -218,13 +467,15 @@ async def delete_processed_document(
     
     此端点将：
     1. 根据ID查找处理过的文档记录
-    2. 删除关联的物理文件
-    3. 从数据库中删除文档记录
+    2. 从数据库中删除文档记录
+    3. 响应发送后删除关联的物理文件
     
     - **processed_document_id**: 要删除的处理过文档的ID
     """
-    # 调用服务层的删除方法
-    success = await document_service.delete_processed_document(db=db, processed_document_id=processed_document_id)
+    # 调用服务层的删除方法，物理文件在响应发送后删除
+    success = await document_service.delete_processed_document(
+        db=db, processed_document_id=processed_document_id, background_tasks=background_tasks
+    )
     
     if not success:
         raise HTTPException(status_code=404, detail=f"Processed document with ID {processed_document_id} not found")
@@ -238,6 +489,7 @@ async def delete_processed_document(
     summary="结构化处理HTML文档",
     description="对已处理的HTML文档进行结构化解析，提取标题、表格、图片和文本，并构建树形结构。",
 )
+@handle_structure_errors("文档结构化处理失败")
 def structure_document(
     *,
     processed_document_id: int = Path(..., description="要结构化处理的已处理文档ID"),
@@ -253,6 +505,8 @@ def structure_document(
     
     - **processed_document_id**: 已处理文档ID
     """
+    from api.services.document_structure_service import document_structure_service
+
     # 直接获取处理过的文档
     processed_document = document_service.get_processed_document(db, processed_document_id=processed_document_id)
     if not processed_document:
@@ -261,6 +515,9 @@ def structure_document(
     if processed_document.format.lower() != "html":
         raise HTTPException(status_code=400, detail=f"ID为{processed_document_id}的文档格式不是HTML")
     
+    if processed_document.status != ProcessingStatus.COMPLETED.value:
+        raise HTTPException(status_code=409, detail=f"ID为{processed_document_id}的文档尚未转换完成，当前状态：{processed_document.status}")
+    
     try:
         # 先删除已存在的结构信息
         deleted_count = document_structure_service.delete_document_structure(
@@ -269,7 +526,7 @@ def structure_document(
         
         # 对文档进行结构化处理
         nodes = document_structure_service.process_html_document(
-            db=db, processed_document_id=processed_document_id
+            db=db, processed_doc=processed_document
         )
         
         return {
@@ -280,12 +537,6 @@ def structure_document(
         raise HTTPException(status_code=400, detail=str(e))
     except IOError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        error_message = f"文档结构化处理失败: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
 
 @router.get(
     "/processed/{processed_document_id}/structure",
@@ -293,6 +544,7 @@ def structure_document(
     summary="获取处理文档的结构",
     description="获取特定已处理文档的树形结构，节点按照标题层级组织。",
 )
+@handle_structure_errors("获取文档结构失败")
 def get_processed_document_structure(
     *,
     processed_document_id: int = Path(..., description="已处理文档ID"),
@@ -306,27 +558,22 @@ def get_processed_document_structure(
     
     - **processed_document_id**: 已处理文档ID
     """
+    from api.services.document_structure_service import document_structure_service
+
     # 直接获取处理过的文档
     processed_document = document_service.get_processed_document(db, processed_document_id=processed_document_id)
     if not processed_document:
         raise HTTPException(status_code=404, detail=f"未找到ID为{processed_document_id}的处理文档")
     
-    try:
-        # 获取文档结构
-        structure = document_structure_service.get_document_structure(
-            db=db, processed_document_id=processed_document_id
-        )
-        return {
-            "processed_document_id": processed_document_id, 
-            "original_document_id": processed_document.original_document_id,
-            "structure": structure
-        }
-    except Exception as e:
-        error_message = f"获取文档结构失败: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
+    # 流式返回文档结构，节点按顺序边读取边序列化
+    return StreamingResponse(
+        _stream_with_own_session(
+            document_structure_service.iter_document_structure_json,
+            processed_document_id=processed_document_id,
+            original_document_id=processed_document.original_document_id,
+        ),
+        media_type="application/json",
+    )
 
 @router.get(
     "/nodes/{node_id}/content",
@@ -334,6 +581,7 @@ def get_processed_document_structure(
     summary="获取节点内容",
     description="获取指定节点及其子节点的内容，特别适用于获取标题下的所有内容。",
 )
+@handle_structure_errors("获取节点内容失败")
 def get_node_content(
     *,
     node_id: int = Path(..., description="节点ID"),
@@ -347,20 +595,15 @@ def get_node_content(
     
     - **node_id**: 节点ID，通常是标题节点
     """
-    try:
-        # 获取节点及其子内容
-        nodes = document_structure_service.get_header_subtree(db=db, node_id=node_id)
+    from api.services.document_structure_service import document_structure_service
+
+    # 获取节点及其子内容
+    nodes = document_structure_service.get_header_subtree(db=db, node_id=node_id)
+    
+    if not nodes:
+        raise HTTPException(status_code=404, detail=f"未找到ID为{node_id}的节点或该节点不是标题节点")
         
-        if not nodes:
-            raise HTTPException(status_code=404, detail=f"未找到ID为{node_id}的节点或该节点不是标题节点")
-            
-        return {"node": nodes[0], "children": nodes[1:] if len(nodes) > 1 else []}
-    except Exception as e:
-        error_message = f"获取节点内容失败: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
+    return {"node": nodes[0], "children": nodes[1:] if len(nodes) > 1 else []}
 
 @router.delete(
     "/processed/{processed_document_id}/structure",
@@ -368,6 +611,7 @@ def get_node_content(
     summary="删除文档结构信息",
     description="删除指定已处理文档的所有结构化节点信息。",
 )
+@handle_structure_errors("删除文档结构失败")
 def delete_document_structure(
     *,
     processed_document_id: int = Path(..., description="已处理文档ID"),
@@ -380,23 +624,18 @@ def delete_document_structure(
     
     - **processed_document_id**: 已处理文档ID
     """
+    from api.services.document_structure_service import document_structure_service
+
     # 检查处理文档是否存在
     processed_document = document_service.get_processed_document(db, processed_document_id=processed_document_id)
     if not processed_document:
         raise HTTPException(status_code=404, detail=f"未找到ID为{processed_document_id}的处理文档")
     
-    try:
-        # 删除文档结构
-        deleted_count = document_structure_service.delete_document_structure(
-            db=db, processed_document_id=processed_document_id
-        )
-        return {"message": f"成功删除文档结构，共删除{deleted_count}个节点", "processed_document_id": processed_document_id}
-    except Exception as e:
-        error_message = f"删除文档结构失败: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
+    # 删除文档结构
+    deleted_count = document_structure_service.delete_document_structure(
+        db=db, processed_document_id=processed_document_id
+    )
+    return {"message": f"成功删除文档结构，共删除{deleted_count}个节点", "processed_document_id": processed_document_id}
 
 @router.get(
     "/processed/{processed_document_id}/toc",
@@ -405,6 +644,7 @@ def delete_document_structure(
     summary="获取文档目录结构",
     description="获取文档的目录结构，仅包含标题节点，形成树形层级结构。",
 )
+@handle_structure_errors("获取目录结构失败")
 def get_document_toc(
     *,
     processed_document_id: int = Path(..., description="已处理文档ID"),
@@ -418,27 +658,22 @@ def get_document_toc(
     
     - **processed_document_id**: 已处理文档ID
     """
+    from api.services.document_structure_service import document_structure_service
+
     # 检查处理文档是否存在
     processed_document = document_service.get_processed_document(db, processed_document_id=processed_document_id)
     if not processed_document:
         raise HTTPException(status_code=404, detail=f"未找到ID为{processed_document_id}的处理文档")
     
-    try:
-        # 获取简化的目录结构
-        toc = document_structure_service.get_document_toc_simplified(
-            db=db, processed_document_id=processed_document_id
-        )
-        return schemas.document_node.DocumentToc(
-            processed_document_id=processed_document_id, 
+    # 流式返回简化的目录结构
+    return StreamingResponse(
+        _stream_with_own_session(
+            document_structure_service.iter_document_toc_json,
+            processed_document_id=processed_document_id,
             original_document_id=processed_document.original_document_id,
-            toc=toc
-        )
-    except Exception as e:
-        error_message = f"获取目录结构失败: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
+        ),
+        media_type="application/json",
+    )
 
 
 @router.get(
@@ -448,6 +683,7 @@ def get_document_toc(
     summary="搜索标题内容",
     description="根据内容模糊搜索标题，并返回匹配的标题节点及其子节点。",
 )
+@handle_structure_errors("搜索标题失败")
 def search_headers(
     *,
     processed_document_id: int = Path(..., description="已处理文档ID"),
@@ -463,55 +699,55 @@ def search_headers(
     - **processed_document_id**: 已处理文档ID
     - **query**: 搜索文本，将进行模糊匹配
     """
+    from api.services.document_structure_service import document_structure_service
+
     # 检查处理文档是否存在
     processed_document = document_service.get_processed_document(db, processed_document_id=processed_document_id)
     if not processed_document:
         raise HTTPException(status_code=404, detail=f"未找到ID为{processed_document_id}的处理文档")
     
-    try:
-        # 搜索标题
-        header_nodes = document_structure_service.search_headers_by_content(
-            db=db, processed_document_id=processed_document_id, search_text=query
-        )
-        
-        if not header_nodes:
-            return schemas.document_node.HeaderSearchResponse(
-                message="未找到匹配的标题",
-                processed_document_id=processed_document_id,
-                query=query,
-                results=[]
-            )
-        
-        # 对每个匹配的标题获取其子节点，并转换为简化模型
-        results = []
-        for header in header_nodes:
-            # 创建简化的标题节点
-            simplified_header = schemas.document_node.SimpleTocNode(
-                id=header.id,
-                content=header.content,
-                parent_id=header.parent_id,
-                node_metadata=header.node_metadata
-            )
-            
-            # 获取子节点
-            nodes = document_structure_service.get_header_subtree(db=db, node_id=header.id)
-            children = nodes[1:] if len(nodes) > 1 else []
-            
-            # 添加结果
-            results.append(schemas.document_node.HeaderSearchResult(
-                header=simplified_header,
-                children=children
-            ))
-            
+    # 搜索标题
+    header_nodes = document_structure_service.search_headers_by_content(
+        db=db, processed_document_id=processed_document_id, search_text=query
+    )
+    
+    if not header_nodes:
         return schemas.document_node.HeaderSearchResponse(
-            message=f"找到{len(header_nodes)}个匹配的标题",
+            message="未找到匹配的标题",
             processed_document_id=processed_document_id,
             query=query,
-            results=results
+            results=[]
         )
-    except Exception as e:
-        error_message = f"搜索标题失败: {str(e)}"
-        print(f"ERROR - {error_message}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_message)
+    
+    # 一次查询获取所有匹配标题的子节点
+    subtrees = document_structure_service.get_header_subtrees_bulk(db=db, header_nodes=header_nodes)
+    
+    # 对每个匹配的标题组装其子节点，并转换为简化模型
+    results = []
+    for header in header_nodes:
+        # 创建简化的标题节点
+        simplified_header = schemas.document_node.SimpleTocNode(
+            id=header.id,
+            content=header.content,
+            parent_id=header.parent_id,
+            node_metadata=header.node_metadata
+        )
+        
+        # 获取子节点
+        nodes = subtrees.get(header.id, [])
+        children = nodes[1:] if len(nodes) > 1 else []
+        
+        # 添加结果
+        results.append(schemas.document_node.HeaderSearchResult(
+            header=simplified_header,
+            children=children
+        ))
+        
+    response = schemas.document_node.HeaderSearchResponse(
+        message=f"找到{len(header_nodes)}个匹配的标题",
+        processed_document_id=processed_document_id,
+        query=query,
+        results=results
+    )
+    # 结果已在构建时完成校验，直接返回以跳过response_model的二次校验
+    return ORJSONResponse(content=response.model_dump())
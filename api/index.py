@@ -1,8 +1,18 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import logging
+import multiprocessing
 from fastapi import FastAPI, Depends
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 # from .endpoints import documents, agents
 from api.endpoints import documents
-from sqlalchemy.orm import Session
-from api.db.session import get_db
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.db.session import dispose_engines, get_async_db, get_async_sessionmaker
+from api.models.document import Document
+from api.core.config import get_settings
+from api.core.logging_config import setup_logging, setup_worker_logging
 import os
 from dotenv import load_dotenv
 
@@ -12,12 +22,57 @@ load_dotenv()
 # 获取版本信息
 VERSION = os.environ.get("APP_VERSION", "0.1.0")
 
+logger = logging.getLogger(__name__)
+
+
+async def warm_up_database():
+    """
+    启动时预先建立连接池中的连接并完成ORM映射配置，
+    避免由第一个真实请求承担这些开销；数据库暂不可用时不阻止服务启动
+    """
+    try:
+        async with get_async_sessionmaker()() as db:
+            await db.execute(text("SELECT 1"))
+            await db.execute(select(Document).limit(1))
+    except Exception:
+        logger.warning("Database warm-up failed", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时完成一次性的初始化工作"""
+    # 日志经队列由后台线程写出
+    log_listener = setup_logging()
+    settings = get_settings()
+    # 确保存储目录存在
+    settings.setup_directories()
+    # 文档转换是CPU密集型任务，在独立进程中执行，不受GIL限制也不阻塞事件循环；
+    # 工作进程在首次提交任务时才启动，此时主进程已有日志、线程池和连接池等线程，
+    # 使用spawn启动全新的解释器，避免fork复制其他线程持有的锁导致死锁
+    app.state.convert_pool = ProcessPoolExecutor(
+        max_workers=settings.CONVERT_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=setup_worker_logging,
+    )
+    await warm_up_database()
+    yield
+    app.state.convert_pool.shutdown(cancel_futures=True)
+    # 释放数据库连接，避免热重载时泄漏连接
+    await dispose_engines()
+    log_listener.stop()
+
+
 app = FastAPI(
     title="Evolve File Processor",
     description="A file processing backend service",
     version=VERSION,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# 压缩较大的JSON响应（文档列表、文档结构等），小于1KB的响应不压缩
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Health check endpoint
 @app.get("/")
 def read_root():
@@ -27,13 +82,13 @@ def read_root():
     }
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     健康检查端点，验证服务和数据库连接状态
     """
     try:
         # 执行简单查询验证数据库连接
-        db.execute("SELECT 1")
+        await db.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected",
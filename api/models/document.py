@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from api.db.base import Base
 
@@ -13,4 +13,9 @@ class Document(Base):
     created_by = Column(String, nullable=True)  # Simple user tracking
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    processed_documents = relationship("ProcessedDocument", back_populates="original_document", cascade="all, delete-orphan") 
\ No newline at end of file
+    processed_documents = relationship("ProcessedDocument", back_populates="original_document", cascade="all, delete-orphan")
+
+    # 索引以支持按 (created_at, id) 的键集分页
+    __table_args__ = (
+        Index('idx_document_created_at_id', created_at.desc(), id.desc()),
+    )
@@ -36,6 +36,6 @@ class DocumentNode(Base):
     # 索引以优化查询性能
     __table_args__ = (
         Index('idx_document_node_processed_doc_position', 'processed_document_id', 'position'),
-        Index('idx_document_node_processed_doc_type', 'processed_document_id', 'node_type'),
+        Index('idx_document_node_processed_doc_type_position', 'processed_document_id', 'node_type', 'position', 'depth'),
         Index('idx_document_node_parent_id', 'parent_id'),
     ) 
\ No newline at end of file
@@ -1,16 +1,37 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+import enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from api.db.base import Base
 
+
+class ProcessingStatus(str, enum.Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class ProcessedDocument(Base):
     __tablename__ = "processed_documents"
 
     id = Column(Integer, primary_key=True, index=True)
     original_document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
-    file_path = Column(String, nullable=False, unique=True)
+    file_path = Column(String, nullable=True, unique=True)  # 转换完成前为空
     resources_path = Column(String, nullable=True)  # 存储资源文件夹的路径
     format = Column(String, nullable=False, default="html")  # e.g., html, markdown
+    status = Column(String(20), nullable=False, default=ProcessingStatus.COMPLETED.value,
+                    server_default=ProcessingStatus.COMPLETED.value)
+    error_message = Column(Text, nullable=True)  # 转换失败时的错误信息
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     original_document = relationship("Document", back_populates="processed_documents")
-    nodes = relationship("DocumentNode", back_populates="processed_document", cascade="all, delete-orphan") 
\ No newline at end of file
+    nodes = relationship("DocumentNode", back_populates="processed_document", cascade="all, delete-orphan")
+
+    # 索引以支持按原始文档列出处理文档（按创建时间排序），以及按格式查找最新的处理文档
+    __table_args__ = (
+        Index('idx_processed_doc_original_created', 'original_document_id', 'created_at'),
+        Index('idx_processed_doc_original_format_created', 'original_document_id', 'format', 'created_at'),
+    )
+
+
+# relationship("DocumentNode")按名称解析，确保只导入本模型时DocumentNode也已注册
+from api.models.document_node import DocumentNode  # noqa: E402,F401
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 from .processed_document import ProcessedDocument
 
@@ -22,5 +22,13 @@ class Document(DocumentBase):
     created_at: datetime
     processed_documents: list[ProcessedDocument] = []
 
-    class Config:
-        orm_mode = True 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Keyset-paginated list of documents
+class DocumentPage(BaseModel):
+    items: list[Document]
+    has_next: bool
+    next_cursor_id: int | None = None
+    # Only set when count_mode is requested
+    total: int | None = None
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional, Dict, List, Any, Union
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from enum import Enum
 
 
@@ -28,8 +28,7 @@ class DocumentNodeCreate(DocumentNodeBase):
 class DocumentNode(DocumentNodeBase):
     id: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class DocumentNodeWithChildren(BaseModel):
@@ -63,8 +62,7 @@ class SimpleTocNode(BaseModel):
     parent_id: Optional[int] = None
     node_metadata: Optional[Dict[str, Any]] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # 递归类型需要先声明
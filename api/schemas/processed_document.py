@@ -1,23 +1,24 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 from typing import Optional
 
 class ProcessedDocumentBase(BaseModel):
     format: str
-    file_path: str
+    file_path: Optional[str] = None
     resources_path: Optional[str] = None
 
 class ProcessedDocumentCreate(ProcessedDocumentBase):
     original_document_id: int
+    status: str = "completed"
 
 class ProcessedDocumentInDB(ProcessedDocumentBase):
     id: int
     original_document_id: int
+    status: str
+    error_message: Optional[str] = None
     created_at: datetime
 
-    model_config = {
-        "from_attributes": True
-    }
+    model_config = ConfigDict(from_attributes=True)
 
 class ProcessedDocument(ProcessedDocumentInDB):
     pass 
\ No newline at end of file
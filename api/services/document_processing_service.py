@@ -7,7 +7,9 @@ pip install docling==2.36.1
 """
 
 try:
-    from docling.document_converter import DocumentConverter
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import AcceleratorOptions, PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
     from docling_core.types.doc import ImageRefMode
     DOCLING_AVAILABLE = True
 except ImportError:
@@ -22,10 +24,9 @@ import os
 import uuid
 import logging
 
-from api.core.config import settings
+from api.core.config import SUPPORTED_FORMATS, get_settings
+
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DocumentToHTMLConverter:
@@ -35,17 +36,19 @@ class DocumentToHTMLConverter:
             logger.warning("初始化DocumentToHTMLConverter，但docling未安装")
             self.converter = None
         else:
-            self.converter = DocumentConverter()
+            # PDF流水线的模型在配置的设备上运行，auto时有CUDA/MPS可用则使用GPU
+            pipeline_options = PdfPipelineOptions(
+                accelerator_options=AcceleratorOptions(device=get_settings().DOCLING_DEVICE)
+            )
+            self.converter = DocumentConverter(format_options={
+                InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+            })
             
-        self.supported_formats = [
-            '.pdf', '.docx', '.doc', '.pptx', '.ppt',
-            '.html', '.htm', '.png', '.jpg', '.jpeg'
-        ]
-        # 使用环境变量PROCESSED_DIR或默认值
-        self.processed_dir = Path(os.getenv("PROCESSED_DIR", "./storage/processed"))
+        self.supported_formats = SUPPORTED_FORMATS
+        self.processed_dir = Path(get_settings().PROCESSED_DIR)
         # 确保处理目录存在
         self.processed_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"初始化DocumentToHTMLConverter，处理目录: {self.processed_dir}")
+        logger.info("初始化DocumentToHTMLConverter，处理目录: %s", self.processed_dir)
 
     def convert_file(self, file_path: str, output_dir: Optional[str] = None) -> Tuple[str, str]:
         """
@@ -77,27 +80,27 @@ class DocumentToHTMLConverter:
         resources_dir = doc_dir / "resources"
         resources_dir.mkdir(parents=True, exist_ok=True)
         
-        logger.info(f"开始转换文件: {file_path}")
-        logger.info(f"输出目录: {doc_dir}")
-        logger.info(f"资源目录: {resources_dir}")
+        logger.info("开始转换文件: %s", file_path)
+        logger.info("输出目录: %s", doc_dir)
+        logger.info("资源目录: %s", resources_dir)
         
         # 使用Docling转换文档
-        logger.info(f"使用Docling转换文档: {file_path}")
+        logger.info("使用Docling转换文档: %s", file_path)
         result = self.converter.convert(input_path)
         
         # 记录文档中的图片数量
-        logger.info(f"文档中包含 {len(result.document.pictures)} 张图片")
+        logger.info("文档中包含 %d 张图片", len(result.document.pictures))
         
         # 使用Docling的save_as_html方法保存HTML，并指定图片模式和资源目录
         output_file = doc_dir / f"{input_path.stem}.html"
-        logger.info(f"使用Docling的save_as_html方法保存HTML，图片模式为REFERENCED")
+        logger.info("使用Docling的save_as_html方法保存HTML，图片模式为REFERENCED")
         result.document.save_as_html(
             filename=output_file,
             artifacts_dir=resources_dir,
             image_mode=ImageRefMode.REFERENCED
         )
         
-        logger.info(f"HTML文件保存到: {output_file}")
+        logger.info("HTML文件保存到: %s", output_file)
         return str(output_file), str(resources_dir)
 
     def is_supported_format(self, file_path: str) -> bool:
@@ -108,6 +111,23 @@ class DocumentToHTMLConverter:
 # 实例化供 API 层调用
 document_processing_service = DocumentToHTMLConverter()
 
+# 转换进程池的任务入口：API按模块路径在工作进程中调用，docling只在工作进程中加载
+def convert_document(file_path: str, output_dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    进程池任务入口，使用工作进程内的转换器实例转换文档
+    
+    定义为模块级函数以便被pickle，参数和返回值只包含路径字符串。
+    
+    Args:
+        file_path: 输入文件路径
+        output_dir: 可选的输出目录
+        
+    Returns:
+        Tuple[str, str]: (HTML文件路径, 资源目录路径)
+    """
+    return document_processing_service.convert_file(file_path, output_dir)
+
+
 # 测试函数
 def test_document_conversion(file_path: str):
     """
@@ -1,26 +1,127 @@
+import asyncio
+import logging
+import shutil
+import sys
+import time
 import uuid
-import aiofiles
 from pathlib import Path
-from fastapi import UploadFile, HTTPException
+from typing import BinaryIO
+from fastapi import BackgroundTasks, UploadFile, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 import os
-from sqlalchemy import desc
+from sqlalchemy import delete, desc, func, select, text, update
 
 from api.models.document import Document
-from api.models.processed_document import ProcessedDocument
+from api.models.document_node import DocumentNode
+from api.models.processed_document import ProcessedDocument, ProcessingStatus
 from api.schemas.document import DocumentCreate
 from api.schemas.processed_document import ProcessedDocumentCreate
 
 
+logger = logging.getLogger(__name__)
+
 # Use a project-relative path for storage
 STORAGE_PATH = Path("storage/uploads")
 
+# Size of each read from the upload stream; memory use per upload stays O(chunk)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Maximum bytes handed to one os.sendfile call when copying a spooled upload
+SENDFILE_CHUNK_SIZE = 16 * 1024 * 1024
+
+# How long a document count estimate is reused before asking the database again
+COUNT_ESTIMATE_TTL_SECONDS = 60
+
+# Cached (value, expires_at) for estimate_document_count
+_count_estimate_cache: tuple[int, float] | None = None
+
 
 def get_document(db: Session, document_id: int) -> Document | None:
     """
     Retrieves a document by its ID.
     """
-    return db.query(Document).filter(Document.id == document_id).first()
+    return db.get(Document, document_id)
+
+
+def document_exists(db: Session, document_id: int) -> bool:
+    """
+    Checks whether a document exists without loading the row.
+    """
+    return db.scalar(select(1).where(Document.id == document_id)) is not None
+
+
+def get_document_filepath(db: Session, document_id: int) -> str | None:
+    """
+    Returns only the stored file path of a document, or None if it does not exist.
+    """
+    return db.scalar(select(Document.filepath).where(Document.id == document_id))
+
+
+async def estimate_document_count(db: AsyncSession) -> int:
+    """
+    Returns an approximate number of documents without scanning the table.
+
+    On PostgreSQL this reads the planner's row estimate from pg_class; other
+    databases (or a table that has never been analyzed) fall back to an exact
+    count. The value is cached for COUNT_ESTIMATE_TTL_SECONDS.
+    """
+    global _count_estimate_cache
+    now = time.monotonic()
+    if _count_estimate_cache is not None and _count_estimate_cache[1] > now:
+        return _count_estimate_cache[0]
+
+    estimate = -1
+    if db.bind.dialect.name == "postgresql":
+        estimate = (await db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {"table": Document.__tablename__},
+        )).scalar()
+        estimate = -1 if estimate is None else estimate
+    if estimate < 0:
+        estimate = (await db.execute(select(func.count()).select_from(Document))).scalar_one()
+
+    _count_estimate_cache = (estimate, now + COUNT_ESTIMATE_TTL_SECONDS)
+    return estimate
+
+
+def invalidate_document_count_estimate() -> None:
+    """
+    Drops the cached document count so the next estimate is re-read after a
+    document has been added or removed.
+    """
+    global _count_estimate_cache
+    _count_estimate_cache = None
+
+
+def _copy_upload(src: BinaryIO, filepath: Path) -> int:
+    """
+    Copies an upload's spooled file to filepath and returns the number of
+    bytes written.
+
+    Uploads that were rolled over to a temporary file on disk are copied
+    with os.sendfile on Linux, so the data never passes through Python.
+    Small uploads still held in memory are copied chunk by chunk.
+    """
+    src.seek(0)
+    with open(filepath, "wb") as dst:
+        # Same check Starlette uses; calling fileno() on an in-memory
+        # SpooledTemporaryFile would force it to roll over to disk first
+        src_fd = None
+        if sys.platform == "linux" and getattr(src, "_rolled", True):
+            try:
+                src_fd = src.fileno()
+            except OSError:
+                pass
+        if src_fd is not None:
+            dst_fd = dst.fileno()
+            offset = 0
+            while sent := os.sendfile(dst_fd, src_fd, offset, SENDFILE_CHUNK_SIZE):
+                offset += sent
+            return offset
+        shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+        return dst.tell()
 
 
 async def save_upload_file(file: UploadFile, created_by: str, db: Session) -> Document:
@@ -37,24 +138,19 @@ async def save_upload_file(file: UploadFile, created_by: str, db: Session) -> Do
     unique_filename = f"{uuid.uuid4()}_{original_filename}"
     filepath = STORAGE_PATH / unique_filename
 
-    # Save the file asynchronously
+    # Copy the upload to disk in a worker thread so the event loop stays free
     try:
-        # Get file size while reading
-        file_size = 0
-        async with aiofiles.open(filepath, "wb") as f:
-            while content := await file.read(1024 * 1024):  # Read in 1MB chunks
-                file_size += len(content)
-                await f.write(content)
-
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Cannot upload empty file.")
-
+        file_size = await asyncio.to_thread(_copy_upload, file.file, filepath)
     except Exception as e:
         # Clean up failed upload
         if filepath.exists():
             filepath.unlink()
         raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
 
+    if file_size == 0:
+        filepath.unlink()
+        raise HTTPException(status_code=400, detail="Cannot upload empty file.")
+
     # Create the database record
     db_document_in = DocumentCreate(
         filename=original_filename,
@@ -63,10 +159,13 @@ async def save_upload_file(file: UploadFile, created_by: str, db: Session) -> Do
         created_by=created_by,
     )
     
-    db_document = Document(**db_document_in.dict())
+    db_document = Document(**db_document_in.model_dump())
     db.add(db_document)
     db.commit()
     db.refresh(db_document)
+    # 新上传的文档还没有处理文档，序列化响应时无需再查询该关系
+    set_committed_value(db_document, "processed_documents", [])
+    invalidate_document_count_estimate()
 
     return db_document 
 
@@ -75,58 +174,106 @@ def create_processed_document(db: Session, *, processed_document_in: ProcessedDo
     """
     Creates a database record for a processed document.
     """
-    db_processed_document = ProcessedDocument(**processed_document_in.dict())
+    db_processed_document = ProcessedDocument(**processed_document_in.model_dump())
     db.add(db_processed_document)
     db.commit()
     db.refresh(db_processed_document)
     return db_processed_document
 
 
-async def delete_document(document_id: int, db: Session) -> bool:
+def complete_processed_document(db: Session, processed_document_id: int,
+                                file_path: str, resources_path: str | None) -> None:
+    """
+    记录后台转换的输出文件，并将处理文档标记为已完成。
+    """
+    db.execute(
+        update(ProcessedDocument)
+        .where(ProcessedDocument.id == processed_document_id)
+        .values(file_path=file_path, resources_path=resources_path,
+                status=ProcessingStatus.COMPLETED.value, error_message=None)
+    )
+    db.commit()
+
+
+def fail_processed_document(db: Session, processed_document_id: int, error_message: str) -> None:
+    """
+    将处理文档标记为转换失败，并记录错误信息。
+    """
+    db.execute(
+        update(ProcessedDocument)
+        .where(ProcessedDocument.id == processed_document_id)
+        .values(status=ProcessingStatus.FAILED.value, error_message=error_message)
+    )
+    db.commit()
+
+
+async def _remove_files_concurrently(removals: list[tuple]) -> None:
+    """
+    在线程中并发执行多个删除函数，每项为 (删除函数, *参数)，各个文件系统操作的等待时间相互重叠
+    """
+    await asyncio.gather(
+        *(asyncio.to_thread(remove, *args) for remove, *args in removals),
+        return_exceptions=True,
+    )
+
+
+async def _remove_files(background_tasks: BackgroundTasks | None, remove, *args) -> None:
+    """
+    删除物理文件：提供了background_tasks时在响应发送后执行，否则在线程中执行，
+    两种方式都不会阻塞事件循环
+    """
+    if background_tasks is not None:
+        background_tasks.add_task(remove, *args)
+    else:
+        await asyncio.to_thread(remove, *args)
+
+
+async def delete_document(document_id: int, db: Session, background_tasks: BackgroundTasks | None = None) -> bool:
     """
     删除指定 ID 的文档及其所有关联的处理文档和物理文件。
     
+    数据库记录先在一个事务中批量删除并提交，物理文件随后并发删除，
+    文件删除失败不会留下指向已删除文件的记录。
+    
     Args:
         document_id: 要删除的文档 ID
         db: 数据库会话
+        background_tasks: 可选，提供时物理文件在响应发送后删除
         
     Returns:
         bool: 删除成功返回 True，文档不存在返回 False
     """
-    # 查找文档记录
-    document = get_document(db, document_id=document_id)
-    
-    # 如果文档不存在，返回 False
-    if not document:
+    # 只查询原始文档的文件路径，文档不存在时返回 False
+    filepath = get_document_filepath(db, document_id)
+    if filepath is None:
         return False
     
-    # 1. 首先删除所有关联的处理文档
-    processed_documents = get_processed_documents_by_original_id(db, original_document_id=document_id)
-    for processed_doc in processed_documents:
-        # 使用已有的delete_processed_document函数删除每个处理文档
-        await delete_processed_document(db, processed_document_id=processed_doc.id)
-    
-    # 2. 删除原始文档的物理文件
-    filepath = Path(document.filepath)
-    if filepath.exists():
-        try:
-            # 删除物理文件
-            filepath.unlink()
-            
-            # 如果文件目录为空，尝试删除目录
-            try:
-                parent_dir = filepath.parent
-                if parent_dir.exists() and not any(parent_dir.iterdir()):
-                    parent_dir.rmdir()
-            except Exception as e:
-                print(f"Warning: Could not delete empty directory {parent_dir}: {e}")
-        except Exception as e:
-            # 如果文件删除失败，记录错误但继续删除数据库记录
-            print(f"Warning: Could not delete file {filepath}: {e}")
+    # 1. 一次查询取出所有关联处理文档的文件路径
+    processed_paths = db.execute(
+        select(ProcessedDocument.file_path, ProcessedDocument.resources_path)
+        .where(ProcessedDocument.original_document_id == document_id)
+    ).all()
     
-    # 3. 删除数据库记录
-    db.delete(document)
+    # 2. 批量删除结构节点、处理文档和文档本身，一次提交
+    processed_ids = select(ProcessedDocument.id).where(ProcessedDocument.original_document_id == document_id)
+    db.execute(delete(DocumentNode).where(DocumentNode.processed_document_id.in_(processed_ids)))
+    db.execute(delete(ProcessedDocument).where(ProcessedDocument.original_document_id == document_id))
+    db.execute(delete(Document).where(Document.id == document_id))
     db.commit()
+    invalidate_document_count_estimate()
+    
+    # 3. 并发删除所有物理文件
+    removals = [
+        (_remove_processed_files,
+         Path(file_path) if file_path else None,
+         Path(resources_path) if resources_path else None)
+        for file_path, resources_path in processed_paths
+    ]
+    removals.append((_remove_document_files, Path(filepath)))
+    if background_tasks is not None:
+        background_tasks.add_task(_remove_files_concurrently, removals)
+    else:
+        await _remove_files_concurrently(removals)
     
     return True
 
@@ -142,7 +289,7 @@ def get_processed_document(db: Session, processed_document_id: int) -> Processed
     Returns:
         ProcessedDocument: 处理过的文档对象，如果不存在则返回None
     """
-    return db.query(ProcessedDocument).filter(ProcessedDocument.id == processed_document_id).first()
+    return db.get(ProcessedDocument, processed_document_id)
 
 
 def get_processed_documents_by_original_id(db: Session, original_document_id: int) -> list[ProcessedDocument]:
@@ -156,73 +303,102 @@ def get_processed_documents_by_original_id(db: Session, original_document_id: in
     Returns:
         list[ProcessedDocument]: 处理过的文档列表
     """
-    return db.query(ProcessedDocument).filter(ProcessedDocument.original_document_id == original_document_id).all()
+    # 响应模型只包含列字段，不访问关系属性；nodes可能有成千上万条，不做预加载
+    stmt = (
+        select(ProcessedDocument)
+        .where(ProcessedDocument.original_document_id == original_document_id)
+        .order_by(ProcessedDocument.created_at)
+    )
+    return db.execute(stmt).scalars().all()
+
+
+def _remove_document_files(filepath: Path) -> None:
+    """
+    删除原始文档的物理文件，以及删除后变为空的所在目录。
+    失败时只记录警告日志，不影响数据库记录的删除。
+    """
+    if filepath.exists():
+        try:
+            # 删除物理文件
+            filepath.unlink()
+            
+            # 如果文件目录为空，尝试删除目录
+            try:
+                parent_dir = filepath.parent
+                if parent_dir.exists() and not any(parent_dir.iterdir()):
+                    parent_dir.rmdir()
+            except Exception as e:
+                logger.warning("Could not delete empty directory %s: %s", parent_dir, e)
+        except Exception as e:
+            # 如果文件删除失败，记录错误但继续删除数据库记录
+            logger.warning("Could not delete file %s: %s", filepath, e)
 
 
-async def delete_processed_document(db: Session, processed_document_id: int) -> bool:
+def _remove_processed_files(filepath: Path | None, resources_path: Path | None) -> None:
+    """
+    删除处理文档的物理文件和资源目录（尚未转换完成的记录没有文件）。
+    失败时只记录警告日志，不影响数据库记录的删除。
+    """
+    if filepath and filepath.exists():
+        try:
+            # 删除物理文件
+            filepath.unlink()
+        except Exception as e:
+            # 如果文件删除失败，记录错误但继续删除数据库记录
+            logger.warning("Could not delete file %s: %s", filepath, e)
+    
+    # 删除资源目录
+    if resources_path and resources_path.exists():
+        try:
+            # 一次删除整个资源目录，rmtree基于scandir，无需逐个stat判断文件类型
+            shutil.rmtree(resources_path)
+            
+            # 尝试删除父目录（如果为空）
+            parent_dir = resources_path.parent
+            if parent_dir.exists() and not any(parent_dir.iterdir()):
+                parent_dir.rmdir()
+        except Exception as e:
+            logger.warning("Could not delete resources directory %s: %s", resources_path, e)
+
+
+async def delete_processed_document(db: Session, processed_document_id: int,
+                                    background_tasks: BackgroundTasks | None = None) -> bool:
     """
     删除指定ID的处理过的文档及其关联的物理文件和资源目录。
     
     Args:
         db: 数据库会话
         processed_document_id: 处理过的文档ID
+        background_tasks: 可选，提供时物理文件在响应发送后删除
     
     Returns:
         bool: 删除成功返回True，文档不存在返回False
     """
-    # 查找处理过的文档记录
-    processed_document = get_processed_document(db, processed_document_id)
-    
-    # 如果处理过的文档不存在，返回False
-    if not processed_document:
+    # 只查询文件路径，处理过的文档不存在时返回False
+    paths = db.execute(
+        select(ProcessedDocument.file_path, ProcessedDocument.resources_path)
+        .where(ProcessedDocument.id == processed_document_id)
+    ).first()
+    if paths is None:
         return False
     
-    # 获取文件路径并检查是否存在
-    filepath = Path(processed_document.file_path)
-    if filepath.exists():
-        try:
-            # 删除物理文件
-            filepath.unlink()
-        except Exception as e:
-            # 如果文件删除失败，记录错误但继续删除数据库记录
-            print(f"Warning: Could not delete file {filepath}: {e}")
-    
-    # 删除资源目录
-    if processed_document.resources_path:
-        resources_path = Path(processed_document.resources_path)
-        if resources_path.exists():
-            try:
-                # 删除资源目录下的所有文件
-                for file in resources_path.glob('*'):
-                    try:
-                        if file.is_file():
-                            file.unlink()
-                        elif file.is_dir():
-                            import shutil
-                            shutil.rmtree(file)
-                    except Exception as e:
-                        print(f"Warning: Could not delete resource file {file}: {e}")
-                
-                # 删除资源目录本身
-                resources_path.rmdir()
-                
-                # 尝试删除父目录（如果为空）
-                parent_dir = filepath.parent
-                if parent_dir.exists() and not any(parent_dir.iterdir()):
-                    parent_dir.rmdir()
-            except Exception as e:
-                print(f"Warning: Could not delete resources directory {resources_path}: {e}")
+    filepath = Path(paths.file_path) if paths.file_path else None
+    resources_path = Path(paths.resources_path) if paths.resources_path else None
     
-    # 删除数据库记录
-    db.delete(processed_document)
+    # 批量删除结构节点和处理文档，一次提交；不加载节点，也不逐行级联删除
+    db.execute(delete(DocumentNode).where(DocumentNode.processed_document_id == processed_document_id))
+    db.execute(delete(ProcessedDocument).where(ProcessedDocument.id == processed_document_id))
     db.commit()
     
+    # 删除物理文件和资源目录（资源目录可能包含大量图片）
+    await _remove_files(background_tasks, _remove_processed_files, filepath, resources_path)
+    
     return True 
 
 
 def get_latest_processed_document_by_format(db: Session, original_document_id: int, format: str = "html") -> ProcessedDocument | None:
     """
-    获取指定原始文档的最新处理文档，按指定格式过滤。
+    获取指定原始文档最新的已完成处理文档，按指定格式过滤。
     
     Args:
         db: 数据库会话
@@ -234,5 +410,6 @@ def get_latest_processed_document_by_format(db: Session, original_document_id: i
     """
     return db.query(ProcessedDocument).filter(
         ProcessedDocument.original_document_id == original_document_id,
-        ProcessedDocument.format == format
+        ProcessedDocument.format == format,
+        ProcessedDocument.status == ProcessingStatus.COMPLETED.value
     ).order_by(desc(ProcessedDocument.created_at)).first() 
\ No newline at end of file
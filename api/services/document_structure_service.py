@@ -2,44 +2,175 @@
 文档结构化处理服务
 负责HTML文档的解析、树形结构构建和节点存储
 """
-from typing import List, Dict, Any, Tuple, Optional
-import os
-from bs4 import BeautifulSoup
+from bisect import bisect_left
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Union
+from pathlib import Path
+import orjson
+from lxml import html as lxml_html
+from sqlalchemy import and_, delete, func, insert, or_, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
 from api.models.document_node import DocumentNode, NodeType
-from api.schemas.document_node import DocumentNodeCreate
 from api.models.processed_document import ProcessedDocument
 
 
+# 流式输出时每批从数据库读取的节点数
+STREAM_BATCH_SIZE = 500
+
+# 流式输出时每次写出的JSON片段大小（字节）
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 解析时按标签分类用到的标签集合
+HEADER_TAGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+TABLE_TAGS = frozenset({'table', 'td', 'th'})
+TEXT_BLOCK_TAGS = frozenset({'p', 'div', 'ul', 'ol', 'pre', 'blockquote'})
+# 直接父元素是这些标签的文本块不单独成为节点
+TEXT_BLOCK_EXCLUDED_PARENT_TAGS = TABLE_TAGS | {'li'}
+# 会单独成为节点的元素，包含它们的文本块整体跳过
+STANDALONE_TAGS = HEADER_TAGS | {'table', 'img'}
+
+# 解析前统一编码为UTF-8字节，避免带编码声明的文档无法以str形式解析
+_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+
+
+def _to_html(element) -> str:
+    """序列化单个元素的HTML，不包含元素之后的尾随文本"""
+    return lxml_html.tostring(element, encoding='unicode', with_tail=False)
+
+
+@dataclass(slots=True)
+class _TempNode:
+    """解析阶段的节点数据，保存到数据库前只在内存中使用"""
+    temp_id: int
+    # 父标题节点的临时ID
+    parent_id: Optional[int]
+    node_type: NodeType
+    content: str
+    node_metadata: Dict[str, Any]
+    position: int
+    depth: int
+
+
+@dataclass(slots=True)
+class _ExtractState:
+    """_extract_nodes遍历过程中的状态"""
+    # 临时存储所有节点
+    temp_nodes: List[_TempNode] = field(default_factory=list)
+    # 标题层级栈，用于跟踪当前在处理哪一级标题下的内容
+    # 栈中每个元素格式为 [标题级别(1-6), 节点ID]
+    header_stack: List[List[int]] = field(default_factory=list)
+    
+    def add_node(self, node_type: NodeType, content: str, node_metadata: Dict[str, Any]) -> int:
+        """添加一个挂在当前活动标题下的节点，返回其临时ID"""
+        # 每添加一个节点position加1，与临时ID相同
+        temp_id = len(self.temp_nodes)
+        self.temp_nodes.append(_TempNode(
+            temp_id=temp_id,
+            parent_id=self.header_stack[-1][1] if self.header_stack else None,
+            node_type=node_type,
+            content=content,
+            node_metadata=node_metadata,
+            position=temp_id,
+            depth=len(self.header_stack)  # 深度取决于栈的深度
+        ))
+        return temp_id
+
+
+def _handle_header(element, state: _ExtractState) -> None:
+    """处理标题元素"""
+    header_level = int(element.tag[1])  # 提取数字得到标题级别
+    
+    # 计算父节点 - 查找栈中小于当前标题级别的最近一个标题
+    header_stack = state.header_stack
+    while header_stack and header_stack[-1][0] >= header_level:
+        header_stack.pop()  # 移除更高级别或同级的标题
+    
+    # 每段文本去除首尾空白后直接拼接
+    temp_id = state.add_node(
+        NodeType.HEADER,
+        ''.join(text.strip() for text in element.itertext()),
+        {'level': header_level}
+    )
+    
+    # 将当前标题压入栈
+    header_stack.append([header_level, temp_id])
+
+
+def _handle_table(element, state: _ExtractState) -> None:
+    """处理表格元素"""
+    # 只处理"整个"表格，忽略嵌套在表格单元格内的表格
+    if element.getparent().tag in TABLE_TAGS:
+        return
+    
+    rows = len(element.findall('tr'))
+    cols = 0
+    first_row = element.find('.//tr')
+    if first_row is not None:
+        cols = sum(1 for cell in first_row if cell.tag in ('td', 'th'))
+    
+    state.add_node(NodeType.TABLE, _to_html(element), {'rows': rows, 'cols': cols})
+
+
+def _handle_image(element, state: _ExtractState) -> None:
+    """处理图片元素"""
+    # 忽略表格内的图片
+    if element.getparent().tag in TABLE_TAGS:
+        return
+    
+    state.add_node(
+        NodeType.IMAGE,
+        _to_html(element),
+        {'src': element.get('src', ''), 'alt': element.get('alt', '')}
+    )
+
+
+def _handle_text_block(element, state: _ExtractState) -> None:
+    """处理文本块元素"""
+    # 忽略表格内的文本块和嵌套在列表项内的块
+    if (element.getparent().tag in TEXT_BLOCK_EXCLUDED_PARENT_TAGS or
+            next(element.iterancestors(*TABLE_TAGS), None) is not None):
+        return
+    
+    # 如果元素内包含标题、表格或图片，则跳过，这些会单独处理
+    if (next(element.iterdescendants(*STANDALONE_TAGS), None) is not None or
+            not element.text_content().strip()):
+        return
+    
+    state.add_node(NodeType.TEXT, _to_html(element), {'tag': element.tag})
+
+
+# 标签 -> 节点处理函数
+_NODE_HANDLERS: Dict[str, Callable[[Any, _ExtractState], None]] = {
+    **{tag: _handle_header for tag in HEADER_TAGS},
+    'table': _handle_table,
+    'img': _handle_image,
+    **{tag: _handle_text_block for tag in TEXT_BLOCK_TAGS},
+}
+
+
 class DocumentStructureService:
     """文档结构化服务，负责HTML文档的解析和树形结构构建"""
     
-    def process_html_document(self, db: Session, processed_document_id: int) -> List[DocumentNode]:
+    def process_html_document(self, db: Session, processed_doc: ProcessedDocument) -> List[DocumentNode]:
         """
         处理HTML文档，提取结构并保存到数据库
         
         Args:
             db: 数据库会话
-            processed_document_id: 已处理文档ID
+            processed_doc: 调用方已查询到的处理文档对象，避免重复查询
             
         Returns:
             List[DocumentNode]: 创建的文档节点列表
         """
-        # 1. 获取处理过的HTML文档
-        processed_doc = db.query(ProcessedDocument).filter(
-            ProcessedDocument.id == processed_document_id
-        ).first()
-        
-        if not processed_doc:
-            raise ValueError(f"未找到ID为{processed_document_id}的文档")
-        
-        if not processed_doc.file_path.endswith('.html'):
+        # 1. 检查处理过的HTML文档
+        if Path(processed_doc.file_path).suffix != '.html':
             raise ValueError(f"文档格式不是HTML：{processed_doc.file_path}")
             
-        # 2. 读取HTML文件内容
+        # 2. 读取HTML文件内容（直接读取字节交给lxml解析，不额外解码为str再编码）
         try:
-            with open(processed_doc.file_path, 'r', encoding='utf-8') as file:
+            with open(processed_doc.file_path, 'rb') as file:
                 html_content = file.read()
         except Exception as e:
             raise IOError(f"读取HTML文件失败: {str(e)}")
@@ -48,153 +179,64 @@ class DocumentStructureService:
         nodes_data = self._parse_html_to_nodes(html_content)
         
         # 4. 存储节点到数据库
-        return self._save_nodes_to_db(db, processed_document_id, nodes_data)
+        return self._save_nodes_to_db(db, processed_doc.id, nodes_data)
     
-    def _parse_html_to_nodes(self, html_content: str) -> List[Dict[str, Any]]:
+    def _parse_html_to_nodes(self, html_content: Union[str, bytes]) -> List[_TempNode]:
         """
         解析HTML内容，提取节点信息，并按照标题层级构建树结构
         
         Args:
-            html_content: HTML文档内容
+            html_content: HTML文档内容，bytes按UTF-8解析
             
         Returns:
-            List[Dict]: 节点数据列表
+            List[_TempNode]: 节点数据列表
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-        temp_nodes = []  # 临时存储所有节点
-        
-        # 获取body内容
-        body = soup.body or soup
-        
         # 第一步：提取所有元素并放入临时列表
-        position = 0
-        
-        # 标题层级栈，用于跟踪当前在处理哪一级标题下的内容
-        # 栈中每个元素格式为 [标题级别(1-6), 节点ID]
-        header_stack = []
-        
-        # 扁平方式遍历所有元素
-        for element in body.descendants:
-            if not hasattr(element, 'name') or element.name is None:
-                continue
-                
-            # 忽略script和style标签
-            if element.name in ('script', 'style'):
-                continue
-                
-            # 处理标题元素
-            if element.name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
-                header_level = int(element.name[1])  # 提取数字得到标题级别
-                
-                # 计算父节点 - 查找栈中小于当前标题级别的最近一个标题
-                parent_id = None
-                while header_stack and header_stack[-1][0] >= header_level:
-                    header_stack.pop()  # 移除更高级别或同级的标题
-                    
-                if header_stack:
-                    parent_id = header_stack[-1][1]
-                    
-                # 创建标题节点
-                node_data = {
-                    'temp_id': len(temp_nodes),
-                    'parent_id': parent_id,
-                    'node_type': NodeType.HEADER,
-                    'content': element.get_text(strip=True),
-                    'node_metadata': {'level': header_level},
-                    'position': position,
-                    'depth': len(header_stack)  # 深度取决于栈的深度
-                }
-                temp_nodes.append(node_data)
-                position += 1
-                
-                # 将当前标题压入栈
-                header_stack.append([header_level, node_data['temp_id']])
-                
-            # 处理表格元素
-            elif element.name == 'table' and element.parent.name not in ('table', 'td', 'th'):
-                # 只处理"整个"表格，忽略嵌套在表格单元格内的表格
-                table_html = str(element)
-                rows = len(element.find_all('tr', recursive=False))
-                cols = 0
-                if element.find('tr'):
-                    cols = len(element.find('tr').find_all(['td', 'th'], recursive=False))
-                    
-                # 获取父节点ID - 当前活动的标题
-                parent_id = None
-                if header_stack:
-                    parent_id = header_stack[-1][1]
-                    
-                node_data = {
-                    'temp_id': len(temp_nodes),
-                    'parent_id': parent_id,
-                    'node_type': NodeType.TABLE,
-                    'content': table_html,
-                    'node_metadata': {'rows': rows, 'cols': cols},
-                    'position': position,
-                    'depth': len(header_stack) # 深度取决于栈的深度
-                }
-                temp_nodes.append(node_data)
-                position += 1
-                
-            # 处理图片元素
-            elif element.name == 'img' and element.parent.name not in ('table', 'td', 'th'):
-                # 忽略表格内的图片
-                img_src = element.get('src', '')
-                img_alt = element.get('alt', '')
-                
-                # 获取父节点ID - 当前活动的标题
-                parent_id = None
-                if header_stack:
-                    parent_id = header_stack[-1][1]
-                    
-                node_data = {
-                    'temp_id': len(temp_nodes),
-                    'parent_id': parent_id,
-                    'node_type': NodeType.IMAGE,
-                    'content': str(element),
-                    'node_metadata': {'src': img_src, 'alt': img_alt},
-                    'position': position,
-                    'depth': len(header_stack)
-                }
-                temp_nodes.append(node_data)
-                position += 1
-                
-            # 处理文本块元素
-            elif (element.name in ('p', 'div', 'ul', 'ol', 'pre', 'blockquote') and
-                  element.parent.name not in ('table', 'td', 'th', 'li') and
-                  not any(parent.name in ('table', 'td', 'th') for parent in element.parents if hasattr(parent, 'name'))):
-                # 忽略表格内的文本块和嵌套在列表项内的块
-                
-                # 如果元素内包含标题、表格或图片，则跳过，这些会单独处理
-                if (element.find(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'img'], recursive=True) or
-                    not element.get_text(strip=True)):
-                    continue
-                    
-                # 获取父节点ID - 当前活动的标题
-                parent_id = None
-                if header_stack:
-                    parent_id = header_stack[-1][1]
-                    
-                content_to_store = str(element)
-                
-                node_data = {
-                    'temp_id': len(temp_nodes),
-                    'parent_id': parent_id,
-                    'node_type': NodeType.TEXT,
-                    'content': content_to_store,
-                    'node_metadata': {'tag': element.name},
-                    'position': position,
-                    'depth': len(header_stack)
-                }
-                temp_nodes.append(node_data)
-                position += 1
+        # 提取在单独的方法中进行，返回后解析树即被释放，合并阶段只保留节点数据
+        temp_nodes = self._extract_nodes(html_content)
         
         # 第二步：合并同一标题下的连续文本节点
         merged_nodes = self._merge_consecutive_text_nodes(temp_nodes)
         
         return merged_nodes
     
-    def _merge_consecutive_text_nodes(self, nodes: List[Dict]) -> List[Dict]:
+    def _extract_nodes(self, html_content: Union[str, bytes]) -> List[_TempNode]:
+        """
+        解析HTML内容，按文档顺序提取标题、表格、图片和文本块节点
+        
+        节点中只保存字符串和基本类型，不引用解析树中的元素。
+        
+        Args:
+            html_content: HTML文档内容，bytes按UTF-8解析
+            
+        Returns:
+            List[_TempNode]: 未合并的节点数据列表
+        """
+        if not html_content.strip():
+            return []
+        if isinstance(html_content, str):
+            html_content = html_content.encode('utf-8')
+        
+        # 直接使用lxml的元素树，解析和遍历都在C中完成，不再为每个节点构建BeautifulSoup对象
+        tree = lxml_html.document_fromstring(html_content, parser=_HTML_PARSER)
+        
+        # 获取body内容
+        body = tree.find('body')
+        if body is None:
+            body = tree
+        
+        state = _ExtractState()
+        
+        # 扁平方式遍历所有元素，每个元素只做一次按标签的查表；
+        # 没有处理函数的标签（包括script、style以及注释）直接跳过
+        for element in body.iterdescendants():
+            handler = _NODE_HANDLERS.get(element.tag)
+            if handler is not None:
+                handler(element, state)
+        
+        return state.temp_nodes
+    
+    def _merge_consecutive_text_nodes(self, nodes: List[_TempNode]) -> List[_TempNode]:
         """
         合并拥有相同父节点的连续text节点
         
@@ -202,7 +244,7 @@ class DocumentStructureService:
             nodes: 节点列表
             
         Returns:
-            List[Dict]: 合并后的节点列表
+            List[_TempNode]: 合并后的节点列表
         """
         if not nodes:
             return []
@@ -210,81 +252,71 @@ class DocumentStructureService:
         result = []
         current_parent = None
         text_buffer = []
+        text_temp_ids = []
         text_metadata = {}
         text_position = 0
         text_depth = 0
+        # 原temp_id -> 合并后temp_id，在构建result的同时记录
+        id_mapping = {}
+        
+        def flush_text_buffer():
+            merged_content = '<div class="merged-text">\n' + '\n'.join(text_buffer) + '\n</div>'
+            new_temp_id = len(result)
+            result.append(_TempNode(
+                temp_id=new_temp_id,
+                parent_id=id_mapping.get(current_parent, current_parent),
+                node_type=NodeType.TEXT,
+                content=merged_content,
+                node_metadata={'merged': True, 'count': len(text_buffer), **text_metadata},
+                position=text_position,
+                depth=text_depth
+            ))
+            # 被合并的每个text节点都映射到合并后的节点
+            for temp_id in text_temp_ids:
+                id_mapping[temp_id] = new_temp_id
         
         for node in nodes:
             # 如果是新的parent或非TEXT类型节点，处理之前收集的text
-            if (node['parent_id'] != current_parent and text_buffer) or node['node_type'] != NodeType.TEXT:
+            if (node.parent_id != current_parent and text_buffer) or node.node_type is not NodeType.TEXT:
                 # 添加之前收集的文本（如果有）
                 if text_buffer:
-                    merged_content = '<div class="merged-text">\n' + '\n'.join(text_buffer) + '\n</div>'
-                    
-                    text_node = {
-                        'temp_id': len(result),
-                        'parent_id': current_parent,
-                        'node_type': NodeType.TEXT,
-                        'content': merged_content,
-                        'node_metadata': {'merged': True, 'count': len(text_buffer), **text_metadata},
-                        'position': text_position,
-                        'depth': text_depth
-                    }
-                    result.append(text_node)
+                    flush_text_buffer()
                     text_buffer = []
+                    text_temp_ids = []
                     text_metadata = {}
             
             # 处理当前节点
-            if node['node_type'] == NodeType.TEXT:
+            if node.node_type is NodeType.TEXT:
                 # 如果是第一个text节点或有新parent
-                if not text_buffer or node['parent_id'] != current_parent:
-                    current_parent = node['parent_id']
-                    text_position = node['position']
-                    text_depth = node['depth']
+                if not text_buffer or node.parent_id != current_parent:
+                    current_parent = node.parent_id
+                    text_position = node.position
+                    text_depth = node.depth
                     if not text_buffer:  # 保存第一个文本节点的元数据
-                        text_metadata = node.get('node_metadata', {})
+                        text_metadata = node.node_metadata
                 
                 # 将文本内容添加到缓冲区
-                text_buffer.append(node['content'])
+                text_buffer.append(node.content)
+                text_temp_ids.append(node.temp_id)
             else:
-                # 非TEXT类型节点直接添加，并更新temp_id
-                updated_node = node.copy()
-                updated_node['temp_id'] = len(result)
+                # 非TEXT类型节点直接添加，并更新temp_id；
+                # 父节点总是排在子节点之前，其映射此时已经记录
+                updated_node = replace(
+                    node,
+                    temp_id=len(result),
+                    parent_id=id_mapping.get(node.parent_id, node.parent_id)
+                )
+                id_mapping[node.temp_id] = updated_node.temp_id
                 result.append(updated_node)
         
         # 处理最后剩余的text缓冲区
         if text_buffer:
-            merged_content = '<div class="merged-text">\n' + '\n'.join(text_buffer) + '\n</div>'
-            text_node = {
-                'temp_id': len(result),
-                'parent_id': current_parent,
-                'node_type': NodeType.TEXT,
-                'content': merged_content,
-                'node_metadata': {'merged': True, 'count': len(text_buffer), **text_metadata},
-                'position': text_position,
-                'depth': text_depth
-            }
-            result.append(text_node)
-            
-        # 更新所有节点的parent_id引用
-        id_mapping = {}
-        for old_idx, old_node in enumerate(nodes):
-            for new_idx, new_node in enumerate(result):
-                # 非TEXT节点通过位置和类型匹配
-                if old_node['node_type'] != NodeType.TEXT and new_node['node_type'] == old_node['node_type']:
-                    if new_node['position'] == old_node['position']:
-                        id_mapping[old_node['temp_id']] = new_node['temp_id']
-                        break
-        
-        # 更新parent_id
-        for node in result:
-            if node['parent_id'] is not None and node['parent_id'] in id_mapping:
-                node['parent_id'] = id_mapping[node['parent_id']]
+            flush_text_buffer()
                     
         return result
     
     def _save_nodes_to_db(self, db: Session, processed_document_id: int, 
-                         nodes_data: List[Dict]) -> List[DocumentNode]:
+                         nodes_data: List[_TempNode]) -> List[DocumentNode]:
         """
         将节点数据保存到数据库
         
@@ -296,84 +328,216 @@ class DocumentStructureService:
         Returns:
             List[DocumentNode]: 创建的文档节点列表
         """
-        # 创建ID映射，将临时ID映射到实际数据库ID
-        id_mapping = {}
-        db_nodes = []
+        if not nodes_data:
+            db.commit()
+            return []
         
-        # 首先创建所有节点，但不设置父子关系
-        for node_data in nodes_data:
-            temp_id = node_data.pop('temp_id')
-            
-            # 复制节点数据并添加处理文档ID
-            create_data = {**node_data}
-            create_data['processed_document_id'] = processed_document_id
-            
-            # 暂时移除parent_id
-            parent_temp_id = create_data.pop('parent_id')
-            
-            # 创建节点
-            db_node = DocumentNode(**create_data)
-            db.add(db_node)
-            db.flush()  # 获取ID
-            
-            # 保存ID映射
-            id_mapping[temp_id] = db_node.id
-            db_nodes.append(db_node)
-            
-            # 存储原始父ID信息，稍后更新
-            db_node._parent_temp_id = parent_temp_id
-            
-        # 更新父子关系
-        for db_node in db_nodes:
-            if hasattr(db_node, '_parent_temp_id') and db_node._parent_temp_id is not None:
-                db_node.parent_id = id_mapping.get(db_node._parent_temp_id)
-                delattr(db_node, '_parent_temp_id')
+        rows = [
+            {
+                'processed_document_id': processed_document_id,
+                'node_type': node_data.node_type,
+                'content': node_data.content,
+                'node_metadata': node_data.node_metadata,
+                'position': node_data.position,
+                'depth': node_data.depth,
+            }
+            for node_data in nodes_data
+        ]
+        
+        node_ids = self._preallocate_node_ids(db, len(nodes_data))
+        if node_ids is not None:
+            # 插入前即可填好parent_id，一条批量INSERT写入整棵树，不再需要第二轮UPDATE
+            id_mapping = {
+                node_data.temp_id: node_id
+                for node_data, node_id in zip(nodes_data, node_ids)
+            }
+            for row, node_data, node_id in zip(rows, nodes_data, node_ids):
+                row['id'] = node_id
+                # 父节点总是排在子节点之前，同一批或更早的批次中先插入
+                row['parent_id'] = id_mapping.get(node_data.parent_id) if node_data.parent_id is not None else None
+            db_nodes = db.scalars(
+                insert(DocumentNode).returning(DocumentNode, sort_by_parameter_order=True),
+                rows
+            ).all()
+            db.commit()
+            return db_nodes
+        
+        # 其他数据库：一条批量INSERT写入所有节点（暂不设置父子关系），按参数顺序返回创建的节点
+        db_nodes = db.scalars(
+            insert(DocumentNode).returning(DocumentNode, sort_by_parameter_order=True),
+            rows
+        ).all()
+        
+        # 将临时ID映射到实际数据库ID
+        id_mapping = {
+            node_data.temp_id: db_node.id
+            for node_data, db_node in zip(nodes_data, db_nodes)
+        }
+        
+        # 批量更新父子关系
+        parent_updates = []
+        for node_data, db_node in zip(nodes_data, db_nodes):
+            parent_id = id_mapping.get(node_data.parent_id) if node_data.parent_id is not None else None
+            if parent_id is not None:
+                parent_updates.append({'id': db_node.id, 'parent_id': parent_id})
+                # 同步内存中的对象，不产生额外的UPDATE
+                set_committed_value(db_node, 'parent_id', parent_id)
+        if parent_updates:
+            db.execute(update(DocumentNode), parent_updates)
                 
         db.commit()
         return db_nodes
     
-    def get_document_structure(self, db: Session, processed_document_id: int) -> List[Dict]:
+    @staticmethod
+    def _preallocate_node_ids(db: Session, count: int) -> Optional[List[int]]:
         """
-        获取文档的树形结构
+        预先从序列中一次取出count个节点ID
         
         Args:
             db: 数据库会话
-            processed_document_id: 处理文档ID
+            count: 需要的ID数量
             
         Returns:
-            List[Dict]: 树形结构
+            Optional[List[int]]: 按顺序分配的ID；数据库不支持序列（非PostgreSQL）时返回None
+        """
+        if db.get_bind().dialect.name != "postgresql":
+            return None
+        return db.scalars(
+            select(func.nextval(func.pg_get_serial_sequence('document_nodes', 'id')))
+            .select_from(func.generate_series(1, count))
+        ).all()
+    
+    def iter_document_structure_json(self, db: Session, processed_document_id: int,
+                                     original_document_id: int) -> Iterator[bytes]:
         """
-        # 获取所有节点
-        nodes = db.query(DocumentNode).filter(
-            DocumentNode.processed_document_id == processed_document_id
-        ).order_by(DocumentNode.depth, DocumentNode.position).all()
+        流式输出文档树形结构的JSON
         
-        # 构建树结构
-        return self._build_tree_structure(nodes)
+        Args:
+            db: 数据库会话，需在整个迭代期间保持可用
+            processed_document_id: 处理文档ID
+            original_document_id: 原始文档ID
+            
+        Yields:
+            bytes: JSON片段
+        """
+        nodes = db.execute(
+            select(DocumentNode)
+            .where(DocumentNode.processed_document_id == processed_document_id)
+            .order_by(DocumentNode.position)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        ).scalars()
+        
+        yield orjson.dumps({
+            "processed_document_id": processed_document_id,
+            "original_document_id": original_document_id,
+        })[:-1] + b',"structure":'
+        yield from self._iter_tree_json(nodes, self._node_to_dict)
+        yield b"}"
     
-    def _build_tree_structure(self, nodes: List[DocumentNode]) -> List[Dict]:
+    def iter_document_toc_json(self, db: Session, processed_document_id: int,
+                               original_document_id: int) -> Iterator[bytes]:
         """
-        将扁平节点列表构建为树形结构
+        流式输出文档目录（仅标题节点）的JSON，格式与DocumentToc响应模型一致
         
         Args:
-            nodes: 节点列表
+            db: 数据库会话，需在整个迭代期间保持可用
+            processed_document_id: 处理文档ID
+            original_document_id: 原始文档ID
             
-        Returns:
-            List[Dict]: 树形结构
+        Yields:
+            bytes: JSON片段
+        """
+        header_nodes = db.execute(
+            select(DocumentNode)
+            .where(
+                DocumentNode.processed_document_id == processed_document_id,
+                DocumentNode.node_type == NodeType.HEADER
+            )
+            .order_by(DocumentNode.position)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        ).scalars()
+        
+        yield orjson.dumps({
+            "processed_document_id": processed_document_id,
+            "original_document_id": original_document_id,
+        })[:-1] + b',"toc":'
+        yield from self._iter_tree_json(header_nodes, self._node_to_simple_dict)
+        yield b"}"
+    
+    def _iter_tree_json(self, nodes: Iterable[DocumentNode],
+                        to_dict: Callable[[DocumentNode], Dict]) -> Iterator[bytes]:
         """
-        # 创建节点映射
-        node_map = {node.id: {"data": node, "children": []} for node in nodes}
-        root = []
-        
-        # 构建树
-        for node_id, node_data in node_map.items():
-            node = node_data["data"]
-            if node.parent_id is None:
-                root.append(node_data)
-            elif node.parent_id in node_map:
-                node_map[node.parent_id]["children"].append(node_data)
-        
-        return root
+        将按position排序的节点逐个编码为嵌套的树形JSON数组，不在内存中构建整棵树
+        
+        解析时每个节点的所有子孙节点在position上都紧跟在该节点之后，
+        因此用一个祖先栈即可确定每个节点在树中的位置。
+        父节点不在当前祖先链上的节点（其父节点未被输出）被忽略。
+        
+        Args:
+            nodes: 按position排序的节点
+            to_dict: 节点转换为可序列化字典的函数
+            
+        Yields:
+            bytes: JSON片段，每个片段约STREAM_CHUNK_SIZE字节
+        """
+        buffer = bytearray(b"[")
+        ancestors: List[int] = []
+        open_ids = set()
+        # 当前所在的children数组中是否还没有元素
+        first = True
+        
+        for node in nodes:
+            if node.parent_id is not None and node.parent_id not in open_ids:
+                continue
+            
+            # 关闭不再是当前节点祖先的节点
+            while ancestors and ancestors[-1] != node.parent_id:
+                open_ids.discard(ancestors.pop())
+                buffer += b"]}"
+                first = False
+                
+            if not first:
+                buffer += b","
+            buffer += b'{"data":'
+            buffer += orjson.dumps(to_dict(node))
+            buffer += b',"children":['
+            ancestors.append(node.id)
+            open_ids.add(node.id)
+            first = True
+            
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        
+        buffer += b"]}" * len(ancestors)
+        buffer += b"]"
+        yield bytes(buffer)
+    
+    @staticmethod
+    def _node_to_dict(node: DocumentNode) -> Dict[str, Any]:
+        """节点的完整字段"""
+        return {
+            "id": node.id,
+            "processed_document_id": node.processed_document_id,
+            "parent_id": node.parent_id,
+            "node_type": node.node_type,
+            "content": node.content,
+            "node_metadata": node.node_metadata,
+            "position": node.position,
+            "depth": node.depth,
+            "created_at": node.created_at,
+            "updated_at": node.updated_at,
+        }
+    
+    @staticmethod
+    def _node_to_simple_dict(node: DocumentNode) -> Dict[str, Any]:
+        """目录使用的简化字段，与SimpleTocNode响应模型一致"""
+        return {
+            "id": node.id,
+            "content": node.content,
+            "parent_id": node.parent_id,
+            "node_metadata": node.node_metadata,
+        }
     
     def get_header_subtree(self, db: Session, node_id: int) -> List[DocumentNode]:
         """
@@ -387,79 +551,100 @@ class DocumentStructureService:
             List[DocumentNode]: 节点及其子节点
         """
         # 获取目标节点
-        target_node = db.query(DocumentNode).filter(DocumentNode.id == node_id).first()
+        target_node = db.get(DocumentNode, node_id)
         if not target_node or target_node.node_type != NodeType.HEADER:
             return []
-            
-        # 获取目标节点的文档ID、深度和位置
-        doc_id = target_node.processed_document_id
-        target_depth = target_node.depth
-        target_pos = target_node.position
-        
-        # 查找同一文档中的所有后续节点，直到遇到同级或更高级的header
-        result = [target_node]
         
-        # 获取后续节点
-        next_nodes = db.query(DocumentNode).filter(
-            DocumentNode.processed_document_id == doc_id,
-            DocumentNode.position > target_pos
+        # 子树在position上是连续的一段，一次范围查询即可取出节点及其所有子节点
+        return db.query(DocumentNode).filter(
+            self._subtree_range_condition(target_node)
         ).order_by(DocumentNode.position).all()
+    
+    @staticmethod
+    def _subtree_range_condition(header: DocumentNode, include_boundary: bool = False):
+        """
+        header子树对应的position区间条件：从header自身开始，
+        到同一文档中下一个同级或更高级的header之前为止
         
-        # 过滤出属于当前header的节点
-        for node in next_nodes:
-            # 如果遇到同级或更高级的header，则停止
-            if node.node_type == NodeType.HEADER and node.depth <= target_depth:
-                break
-            result.append(node)
-            
-        return result
+        Args:
+            header: 标题节点
+            include_boundary: 是否同时包含作为区间终点的header，
+                多个区间合并查询时用它在Python中判断每段子树的结束
+        """
+        end_position = select(func.min(DocumentNode.position)).where(
+            DocumentNode.processed_document_id == header.processed_document_id,
+            DocumentNode.node_type == NodeType.HEADER,
+            DocumentNode.depth <= header.depth,
+            DocumentNode.position > header.position
+        ).scalar_subquery()
+        
+        return and_(
+            DocumentNode.processed_document_id == header.processed_document_id,
+            DocumentNode.position >= header.position,
+            or_(
+                end_position.is_(None),
+                DocumentNode.position <= end_position if include_boundary else DocumentNode.position < end_position
+            )
+        )
     
-    def delete_document_structure(self, db: Session, processed_document_id: int) -> int:
+    def get_header_subtrees_bulk(self, db: Session, header_nodes: List[DocumentNode]) -> Dict[int, List[DocumentNode]]:
         """
-        删除指定处理文档的所有结构化节点
+        批量获取多个header节点及其子节点内容，用一次查询替代逐个调用get_header_subtree
         
         Args:
             db: 数据库会话
-            processed_document_id: 处理文档ID
+            header_nodes: 已查询到的header节点列表
             
         Returns:
-            int: 删除的节点数量
+            Dict[int, List[DocumentNode]]: header节点ID到"节点及其子节点"列表的映射
         """
-        # 查询属于该文档的所有节点
-        query = db.query(DocumentNode).filter(
-            DocumentNode.processed_document_id == processed_document_id
-        )
+        headers = [node for node in header_nodes if node.node_type == NodeType.HEADER]
+        if not headers:
+            return {}
         
-        # 获取节点数量
-        count = query.count()
+        # 只读取各header子树所在的position区间（含终点header）
+        next_nodes = db.query(DocumentNode).filter(
+            or_(*(self._subtree_range_condition(header, include_boundary=True) for header in headers))
+        ).order_by(DocumentNode.processed_document_id, DocumentNode.position).all()
         
-        # 删除所有节点
-        if count > 0:
-            query.delete()
-            db.commit()
+        # 按文档分组，组内保持position顺序
+        doc_nodes: Dict[int, List[DocumentNode]] = {}
+        for node in next_nodes:
+            doc_nodes.setdefault(node.processed_document_id, []).append(node)
+        doc_positions = {doc_id: [node.position for node in nodes] for doc_id, nodes in doc_nodes.items()}
+        
+        subtrees = {}
+        for header in headers:
+            nodes = doc_nodes.get(header.processed_document_id, [])
+            start = bisect_left(doc_positions.get(header.processed_document_id, []), header.position)
+            result = [header]
+            # 与get_header_subtree相同：遇到同级或更高级的header时停止
+            for node in nodes[start + 1:]:
+                if node.node_type == NodeType.HEADER and node.depth <= header.depth:
+                    break
+                result.append(node)
+            subtrees[header.id] = result
             
-        return count
+        return subtrees
     
-    def get_document_toc(self, db: Session, processed_document_id: int) -> List[Dict]:
+    def delete_document_structure(self, db: Session, processed_document_id: int) -> int:
         """
-        获取文档的目录结构（只包含标题节点）
+        删除指定处理文档的所有结构化节点
         
         Args:
             db: 数据库会话
             processed_document_id: 处理文档ID
             
         Returns:
-            List[Dict]: 仅包含标题节点的树形结构
+            int: 删除的节点数量
         """
-        # 获取所有标题节点
-        header_nodes = db.query(DocumentNode).filter(
-            DocumentNode.processed_document_id == processed_document_id,
-            DocumentNode.node_type == NodeType.HEADER
-        ).order_by(DocumentNode.position).all()
-        
-        # 构建树结构
-        return self._build_tree_structure(header_nodes)
-        
+        # 一条DELETE删除所有节点，删除的行数由执行结果直接返回，无需先COUNT
+        result = db.execute(
+            delete(DocumentNode).where(DocumentNode.processed_document_id == processed_document_id)
+        )
+        db.commit()
+        return result.rowcount
+    
     def search_headers_by_content(self, db: Session, processed_document_id: int, search_text: str) -> List[DocumentNode]:
         """
         通过内容模糊搜索标题节点
@@ -473,73 +658,20 @@ class DocumentStructureService:
             List[DocumentNode]: 匹配的标题节点列表
         """
         # 模糊搜索标题节点
-        from sqlalchemy import func
-        
         search_pattern = f"%{search_text}%"
-        header_nodes = db.query(DocumentNode).filter(
+        query = db.query(DocumentNode).filter(
             DocumentNode.processed_document_id == processed_document_id,
             DocumentNode.node_type == NodeType.HEADER,
             DocumentNode.content.ilike(search_pattern)  # 不区分大小写的模糊匹配
-        ).all()
-        
-        return header_nodes
-    
-    def get_document_toc_simplified(self, db: Session, processed_document_id: int) -> List[Dict]:
-        """
-        获取文档的简化目录结构（只包含标题节点的简化版本）
-        
-        Args:
-            db: 数据库会话
-            processed_document_id: 处理文档ID
-            
-        Returns:
-            List[Dict]: 仅包含标题节点简化信息的树形结构
-        """
-        # 获取所有标题节点
-        header_nodes = db.query(DocumentNode).filter(
-            DocumentNode.processed_document_id == processed_document_id,
-            DocumentNode.node_type == NodeType.HEADER
-        ).order_by(DocumentNode.position).all()
-        
-        # 构建简化的树结构
-        return self._build_simplified_tree_structure(header_nodes)
-        
-    def _build_simplified_tree_structure(self, nodes: List[DocumentNode]) -> List[Dict]:
-        """
-        构建简化的树形结构，只保留id、content、node_metadata和父子关系
-        
-        Args:
-            nodes: 节点列表
-            
-        Returns:
-            List[Dict]: 简化的树形结构
-        """
-        if not nodes:
-            return []
-            
-        # 创建简化的节点映射 - 只保留必要字段
-        node_map = {}
-        for node in nodes:
-            node_map[node.id] = {
-                "data": {
-                    "id": node.id,
-                    "content": node.content,
-                    "parent_id": node.parent_id,
-                    "node_metadata": node.node_metadata
-                },
-                "children": []
-            }
+        )
         
-        # 构建树结构
-        root = []
-        for node_id, node_data in node_map.items():
-            parent_id = node_data["data"]["parent_id"]
-            if parent_id is None:
-                root.append(node_data)
-            elif parent_id in node_map:
-                node_map[parent_id]["children"].append(node_data)
+        if db.get_bind().dialect.name == "postgresql":
+            # PostgreSQL上ILIKE由pg_trgm的GIN部分索引支持，按相似度排序结果
+            query = query.order_by(func.similarity(DocumentNode.content, search_text).desc(), DocumentNode.position)
+        else:
+            query = query.order_by(DocumentNode.position)
         
-        return root
+        return query.all()
 
 
 # 实例化服务
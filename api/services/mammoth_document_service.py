@@ -1,27 +1,115 @@
 import os
+import hashlib
+import importlib.metadata
+import io
+import json
+import shutil
 import uuid
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import mammoth
-import base64
+import binascii
 import re
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
-from bs4 import BeautifulSoup
+from typing import Any, List, Dict, Tuple, Optional, TextIO
 
-from api.core.config import settings
+from api.core.config import get_settings
+from api.core.logging_config import setup_worker_logging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 输出HTML的头部和尾部，Mammoth只生成body中的内容
+HTML_PROLOGUE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"/><style>
+                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 800px; margin: 0 auto; padding: 20px; }
+                img { max-width: 100%; height: auto; }
+                .image-container { text-align: center; margin: 15px 0; }
+            </style></head><body>"""
+HTML_EPILOGUE = "</body></html>"
+
+# 转换结果缓存键：对Mammoth版本、缓存格式版本、转换选项和DOCX内容计算SHA-256，取前若干个十六进制字符
+DOCX_HASH_LENGTH = 16
+# 缓存格式版本，修改HTML头尾、图片提取等影响输出的逻辑时递增，旧的缓存项不再命中
+CACHE_FORMAT_VERSION = 1
+MAMMOTH_VERSION = importlib.metadata.version("mammoth")
+# 缓存项中HTML文件的文件名，复用时按原文档名重命名
+CACHED_HTML_NAME = "document.html"
+
+# 图片MIME子类型 -> 文件扩展名，未知类型使用.png
+MIME_EXTENSIONS = {
+    'png': '.png',
+    'jpeg': '.jpg',
+    'jpg': '.jpg',
+    'gif': '.gif',
+    'bmp': '.bmp',
+    'tiff': '.tiff',
+    'svg+xml': '.svg',
+    'webp': '.webp'
+}
+
+# 写出HTML文件时使用的缓冲区大小
+HTML_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# 每次解码的base64字符数，必须是4的倍数，解码后每块约48KB
+BASE64_DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def _write_base64_file(base64_data: str, output_path: Path) -> None:
+    """
+    分块解码base64内容并写入文件，不在内存中保留完整的解码结果
+    
+    先写入同目录下的临时文件，全部解码成功后再重命名为目标文件；
+    中途解码或写入失败时删除临时文件，不会留下不完整的图片。
+    
+    Args:
+        base64_data: 不含data URI前缀的base64内容
+        output_path: 输出文件路径
+    """
+    tmp_path = output_path.with_name(f".{output_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            for start in range(0, len(base64_data), BASE64_DECODE_CHUNK_SIZE):
+                # 直接调用binascii，省去base64.b64decode对输入的额外检查和转换
+                f.write(binascii.a2b_base64(base64_data[start:start + BASE64_DECODE_CHUNK_SIZE]))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _link_or_copy(src: str, dst: str) -> str:
+    """
+    将文件硬链接到目标路径，不复制数据；跨文件系统等无法链接时退回复制
+    
+    签名与shutil.copy2相同，可作为shutil.copytree的copy_function。
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
 class DocxToHTMLConverter:
     """使用 Mammoth 将 DOCX 文档转换为 HTML，并提取图片"""
     
-    def __init__(self):
+    # base64编码图片的data URI，分组为 (MIME子类型, base64内容)
+    _BASE64_IMG_RE = re.compile(r'^data:image/([\w+-]+);base64,(.+)$', re.DOTALL)
+    # Mammoth输出的img标签中的src属性，分组为属性值
+    _IMG_SRC_RE = re.compile(r'<img\b[^>]*?\ssrc="([^"]*)"')
+    
+    def __init__(self, convert_options: Optional[Dict[str, Any]] = None):
+        settings = get_settings()
         self.processed_dir = Path(settings.PROCESSED_DIR)
         # 确保处理目录存在
         self.processed_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"初始化DocxToHTMLConverter，处理目录: {self.processed_dir}")
+        # 传给mammoth.convert_to_html的选项（如style_map），同时参与缓存键的计算
+        self.convert_options = dict(convert_options or {})
+        # 按内容哈希保存的转换结果，相同的DOCX不再重复转换；超出条目上限时淘汰最久未使用的条目
+        self.cache_dir = self.processed_dir / "_cache"
+        self.cache_max_entries = settings.MAMMOTH_CACHE_MAX_ENTRIES
+        logger.info("初始化DocxToHTMLConverter，处理目录: %s", self.processed_dir)
     
     def convert_file(self, file_path: str, output_dir: Optional[str] = None) -> Tuple[str, str]:
         """
@@ -42,147 +130,270 @@ class DocxToHTMLConverter:
         if input_path.suffix.lower() != '.docx':
             raise ValueError(f"Unsupported file format: {input_path.suffix}. Only .docx is supported.")
         
-        if output_dir is None:
-            output_dir = self.processed_dir
-        else:
-            output_dir = Path(output_dir)
-            output_dir.mkdir(parents=True, exist_ok=True)
+        output_dir = self.processed_dir if output_dir is None else Path(output_dir)
         
-        # 为当前文档创建唯一的资源子目录
+        # 为当前文档确定唯一的资源子目录，目录连同上级目录在写入结果前一次创建
         doc_id = f"{uuid.uuid4().hex}_{input_path.stem}"
         doc_dir = output_dir / doc_id
         resources_dir = doc_dir / "resources"
-        resources_dir.mkdir(parents=True, exist_ok=True)
         
-        logger.info(f"开始转换文件: {file_path}")
-        logger.info(f"输出目录: {doc_dir}")
-        logger.info(f"资源目录: {resources_dir}")
+        logger.info("开始转换文件: %s", file_path)
+        logger.info("输出目录: %s", doc_dir)
+        logger.info("资源目录: %s", resources_dir)
+        
+        output_file = doc_dir / f"{input_path.stem}.html"
+        
+        # 内容相同的文档已经转换过时，直接复制缓存的结果
+        # 文件只读取一次，计算哈希和Mammoth转换都使用内存中的内容
+        docx_bytes = input_path.read_bytes()
+        cached_dir = self.cache_dir / self._cache_key(docx_bytes) if self.cache_max_entries > 0 else None
+        if cached_dir is not None and self._copy_from_cache(cached_dir, output_file, resources_dir):
+            logger.info("使用缓存的转换结果 %s，HTML文件保存到: %s", cached_dir.name, output_file)
+            return str(output_file), str(resources_dir)
         
         # 转换文档为HTML
-        with open(input_path, 'rb') as docx_file:
-            # 使用Mammoth转换文档
-            result = mammoth.convert_to_html(docx_file)
-            html_content = result.value
-            messages = result.messages
-            
-            for message in messages:
-                if message.type == "warning":
-                    logger.warning(f"Mammoth警告: {message.message}")
-        
-        # 使用BeautifulSoup解析HTML
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # 添加基本HTML结构
-        if not soup.html:
-            html = BeautifulSoup('<!DOCTYPE html><html><head><meta charset="utf-8"></head><body></body></html>', 'html.parser')
-            html.body.append(soup)
-            soup = html
-        
-        # 添加样式
-        if not soup.head.find('style'):
-            style_tag = soup.new_tag('style')
-            style_tag.string = """
-                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 800px; margin: 0 auto; padding: 20px; }
-                img { max-width: 100%; height: auto; }
-                .image-container { text-align: center; margin: 15px 0; }
-            """
-            soup.head.append(style_tag)
+        resources_dir.mkdir(parents=True)
         
-        # 提取并处理base64编码的图片
-        self._extract_base64_images(soup, resources_dir)
+        # 使用Mammoth转换文档，zipfile在内存缓冲区上读取各个部件，不再产生大量小的文件读取
+        result = mammoth.convert_to_html(io.BytesIO(docx_bytes), **self.convert_options)
+        html_content = result.value
+        messages = result.messages
         
-        # 保存HTML文件
-        output_file = doc_dir / f"{input_path.stem}.html"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
+        for message in messages:
+            if message.type == "warning":
+                logger.warning("Mammoth警告: %s", message.message)
+        
+        # 保存HTML文件，提取并处理base64编码的图片：只改写img标签的src属性，
+        # 其余内容按片段直接写出，不构建文档树，也不拼接完整的输出字符串
+        with open(output_file, 'w', encoding='utf-8', buffering=HTML_WRITE_BUFFER_SIZE) as out:
+            out.write(HTML_PROLOGUE)
+            self._extract_base64_images(html_content, resources_dir, out)
+            out.write(HTML_EPILOGUE)
         
-        logger.info(f"HTML文件保存到: {output_file}")
+        if cached_dir is not None:
+            self._store_in_cache(cached_dir, output_file, resources_dir)
+        
+        logger.info("HTML文件保存到: %s", output_file)
         return str(output_file), str(resources_dir)
     
-    def _extract_base64_images(self, soup: BeautifulSoup, resources_dir: Path):
+    def _cache_key(self, docx_bytes: bytes) -> str:
+        """
+        计算转换结果的缓存键
+        
+        升级Mammoth、修改缓存格式版本或转换选项后得到不同的键，不会命中旧的转换结果。
+        选项中的函数等无法序列化的值按str()参与计算，只会导致缓存不命中，不会误用其他选项的结果。
+        
+        Args:
+            docx_bytes: DOCX文件内容
+            
+        Returns:
+            str: 缓存项目录名
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{MAMMOTH_VERSION}\0{CACHE_FORMAT_VERSION}\0".encode("utf-8"))
+        digest.update(json.dumps(self.convert_options, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(docx_bytes)
+        return digest.hexdigest()[:DOCX_HASH_LENGTH]
+    
+    def _copy_from_cache(self, cached_dir: Path, output_file: Path, resources_dir: Path) -> bool:
+        """
+        将缓存的转换结果复制到输出位置，并更新缓存项的修改时间作为最近使用时间
+        
+        Args:
+            cached_dir: 缓存项目录
+            output_file: 输出的HTML文件
+            resources_dir: 输出的资源目录
+            
+        Returns:
+            bool: 是否命中缓存；未命中时输出位置不留下任何文件
+        """
+        if not cached_dir.is_dir():
+            return False
+        try:
+            shutil.copytree(cached_dir / "resources", resources_dir, copy_function=_link_or_copy)
+            _link_or_copy(cached_dir / CACHED_HTML_NAME, output_file)
+            os.utime(cached_dir)
+        except OSError as e:
+            # 缓存项可能在复制过程中被其他进程淘汰或已损坏，删除缓存项和已复制的部分后重新转换
+            logger.warning("读取转换缓存 %s 失败: %s", cached_dir.name, e)
+            self._remove_cache_entry(cached_dir)
+            shutil.rmtree(output_file.parent, ignore_errors=True)
+            return False
+        return True
+    
+    def _store_in_cache(self, cached_dir: Path, output_file: Path, resources_dir: Path):
+        """
+        将转换结果保存到缓存中，缓存失败不影响本次转换
+        
+        Args:
+            cached_dir: 缓存项目录
+            output_file: 转换生成的HTML文件
+            resources_dir: 转换生成的资源目录
+        """
+        # 先写入临时目录再重命名，其他进程不会看到不完整的缓存项；
+        # 同一内容被并发转换时，后完成的重命名失败，保留先完成的结果
+        tmp_dir = self.cache_dir / f".{cached_dir.name}.{uuid.uuid4().hex}"
+        try:
+            shutil.copytree(resources_dir, tmp_dir / "resources", copy_function=_link_or_copy)
+            _link_or_copy(output_file, tmp_dir / CACHED_HTML_NAME)
+            tmp_dir.rename(cached_dir)
+        except OSError as e:
+            if not cached_dir.is_dir():
+                logger.warning("保存转换缓存失败: %s", e)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self._evict_cache_entries()
+    
+    def _evict_cache_entries(self):
+        """缓存条目超过上限时，按修改时间删除最久未使用的条目"""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            # 以.开头的是正在写入或正在删除的临时目录
+            if entry.name.startswith('.'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry))
+            except FileNotFoundError:
+                continue
+        
+        excess = len(entries) - self.cache_max_entries
+        if excess <= 0:
+            return
+        entries.sort()
+        for _, entry in entries[:excess]:
+            if self._remove_cache_entry(entry):
+                logger.info("淘汰转换缓存: %s", entry.name)
+    
+    def _remove_cache_entry(self, entry: Path) -> bool:
+        """
+        删除一个缓存项
+        
+        先重命名为临时目录再删除，其他进程不会命中删除到一半的缓存项。
+        
+        Returns:
+            bool: 是否由本次调用删除；重命名失败说明缓存项已被其他进程删除
+        """
+        removed_dir = self.cache_dir / f".{entry.name}.{uuid.uuid4().hex}.removed"
+        try:
+            entry.rename(removed_dir)
+        except OSError:
+            return False
+        shutil.rmtree(removed_dir, ignore_errors=True)
+        return True
+    
+    def _extract_base64_images(self, html_content: str, resources_dir: Path, out: TextIO):
         """
         从HTML中提取base64编码的图片，并将其保存为文件
         
+        图片src改写为资源文件相对路径后的HTML内容按片段写入out。
+        
         Args:
-            soup: BeautifulSoup对象
+            html_content: Mammoth生成的HTML内容
             resources_dir: 资源保存目录
+            out: HTML输出文件
         """
-        # 查找所有图片标签
-        img_tags = soup.find_all('img')
-        logger.info(f"在HTML中找到 {len(img_tags)} 个img标签")
-        
         # 用于保存处理过的图片计数
         image_counter = 0
         
-        # 处理每个img标签
-        for img_tag in img_tags:
-            src = img_tag.get('src', '')
+        # 已保存图片data URI的SHA-1摘要 -> 相对路径，重复出现的同一图片只解码和写入一次；
+        # 只保留摘要，各图片的base64内容在处理完后即可释放，不会一直保留到转换结束
+        saved_srcs: Dict[bytes, str] = {}
+        
+        def resolve_src(src: str) -> str:
+            nonlocal image_counter
+            
+            src_key = hashlib.sha1(src.encode("utf-8")).digest()
+            if src_key in saved_srcs:
+                return saved_srcs[src_key]
             
             # 检查是否为base64编码的图片
-            if src.startswith('data:image/'):
-                base64_pattern = re.compile(r'^data:image/(\w+);base64,(.+)$')
-                match = base64_pattern.match(src)
-                
-                if match:
-                    try:
-                        # 提取mime类型和base64内容
-                        img_type, base64_data = match.groups()
-                        
-                        # 确定文件扩展名
-                        extension = self._get_extension_from_mime(img_type)
-                        
-                        # 创建唯一的文件名
-                        image_counter += 1
-                        img_filename = f"image_{image_counter}{extension}"
-                        output_path = resources_dir / img_filename
-                        
-                        # 解码base64并保存为文件
-                        img_data = base64.b64decode(base64_data)
-                        with open(output_path, 'wb') as f:
-                            f.write(img_data)
-                        
-                        # 更新img标签的src属性
-                        img_tag['src'] = f"resources/{img_filename}"
-                        logger.info(f"提取图片 {image_counter}: base64 -> {output_path}")
-                    except Exception as e:
-                        logger.error(f"处理base64图片时出错: {str(e)}")
+            match = self._BASE64_IMG_RE.match(src)
+            if match:
+                try:
+                    # 提取mime类型和base64内容
+                    img_type, base64_data = match.groups()
+                    
+                    # 确定文件扩展名
+                    extension = MIME_EXTENSIONS.get(img_type.lower(), '.png')
+                    
+                    # 创建唯一的文件名，图片保存成功后才占用编号
+                    img_filename = f"image_{image_counter + 1}{extension}"
+                    output_path = resources_dir / img_filename
+                    
+                    # 解码base64并保存为文件
+                    _write_base64_file(base64_data, output_path)
+                    image_counter += 1
+                    
+                    # 更新img标签的src属性
+                    saved_srcs[src_key] = f"resources/{img_filename}"
+                    # 每张图片都会记录一次，使用参数延迟格式化，日志级别未启用时不拼接字符串
+                    logger.info("提取图片 %d: base64 -> %s", image_counter, output_path)
+                    return saved_srcs[src_key]
+                except Exception as e:
+                    logger.error("处理base64图片时出错: %s", e)
             elif src.startswith('word/media/'):
                 # 对于Mammoth可能生成的word/media路径引用，进行替换
-                logger.warning(f"发现未处理的图片路径引用: {src}，已忽略")
-    
-    def _get_extension_from_mime(self, mime_subtype: str) -> str:
-        """根据MIME子类型获取文件扩展名"""
-        mime_map = {
-            'png': '.png',
-            'jpeg': '.jpg',
-            'jpg': '.jpg',
-            'gif': '.gif',
-            'bmp': '.bmp',
-            'tiff': '.tiff',
-            'svg+xml': '.svg',
-            'webp': '.webp'
-        }
-        return mime_map.get(mime_subtype.lower(), '.png')  # 默认使用.png
+                logger.warning("发现未处理的图片路径引用: %s，已忽略", src)
+            return src
+        
+        # 依次写出两个src属性值之间的原始内容和改写后的属性值
+        img_count = 0
+        last_end = 0
+        for img_match in self._IMG_SRC_RE.finditer(html_content):
+            img_count += 1
+            out.write(html_content[last_end:img_match.start(1)])
+            out.write(resolve_src(img_match.group(1)))
+            last_end = img_match.end(1)
+        out.write(html_content[last_end:])
+        logger.info("在HTML中找到 %d 个img标签", img_count)
     
     def convert_batch(self, file_paths: List[str], output_dir: Optional[str] = None) -> List[Tuple[str, str]]:
         """
         批量转换多个DOCX文件为HTML
         
+        转换是CPU密集型操作，各文件提交到进程池中并行转换；
+        单个文件转换失败时记录错误并跳过，不影响其他文件。
+        
         Returns:
-            List[Tuple[str, str]]: 每个文件的(HTML文件路径, 资源目录路径)列表
+            List[Tuple[str, str]]: 每个文件的(HTML文件路径, 资源目录路径)列表，顺序与输入一致
         """
+        if not file_paths:
+            return []
+        
         results = []
-        for file_path in file_paths:
-            try:
-                html_file, resources_dir = self.convert_file(file_path, output_dir)
-                results.append((html_file, resources_dir))
-                logger.info(f"转换完成: {file_path} -> {html_file} (resources: {resources_dir})")
-            except Exception as e:
-                logger.error(f"转换 {file_path} 时出错: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
-                continue
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+        # 与API的转换进程池一样使用spawn，调用方进程中已有的线程不会让工作进程死锁
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=setup_worker_logging,
+        ) as executor:
+            futures = [executor.submit(convert_docx, file_path, output_dir) for file_path in file_paths]
+            for file_path, future in zip(file_paths, futures):
+                try:
+                    html_file, resources_dir = future.result()
+                    results.append((html_file, resources_dir))
+                    logger.info("转换完成: %s -> %s (resources: %s)", file_path, html_file, resources_dir)
+                except Exception as e:
+                    logger.error("转换 %s 时出错: %s", file_path, e, exc_info=True)
         return results
 
 # 实例化供API层调用
-docx_to_html_converter = DocxToHTMLConverter() 
\ No newline at end of file
+docx_to_html_converter = DocxToHTMLConverter()
+
+
+def convert_docx(file_path: str, output_dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    进程池任务入口，使用工作进程内的转换器实例转换DOCX文件
+    
+    定义为模块级函数以便被pickle，参数和返回值只包含路径字符串。
+    
+    Args:
+        file_path: 输入文件路径
+        output_dir: 可选的输出目录
+        
+    Returns:
+        Tuple[str, str]: (HTML文件路径, 资源目录路径)
+    """
+    return docx_to_html_converter.convert_file(file_path, output_dir)
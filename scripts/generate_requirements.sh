@@ -17,16 +17,17 @@ cat > requirements.txt << 'EOL'
 fastapi==0.111.1
 uvicorn==0.29.0
 python-multipart==0.0.7
-aiofiles==0.8.0
 pydantic==2.11.5
 pydantic-settings==2.9.1
 starlette==0.37.2
 python-dotenv==1.1.0
+orjson==3.10.18
 
 # 数据库相关依赖
-sqlalchemy==1.4.50  # 降级版本，因为2.0.41在某些环境中不可用
+sqlalchemy==2.0.30
 alembic==1.16.1
 psycopg2-binary==2.9.10
+asyncpg==0.30.0
 
 # 基础依赖库
 anyio==4.9.0
@@ -0,0 +1,17 @@
+"""
+测试包：API和服务测试使用临时目录中的SQLite数据库和存储目录
+
+pytest和unittest都会先导入本包，环境变量在导入api.db.session和api.core.config之前设置，
+测试不会连接.env中配置的数据库。
+"""
+import atexit
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+TEST_ROOT = Path(tempfile.mkdtemp(prefix="evolve-tests-"))
+atexit.register(shutil.rmtree, TEST_ROOT, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_ROOT / 'test.db'}"
+os.environ["PROCESSED_DIR"] = str(TEST_ROOT / "processed")
+os.environ["UPLOAD_DIR"] = str(TEST_ROOT / "uploads")
@@ -0,0 +1,277 @@
+"""
+测试文档结构化服务：HTML解析、节点保存、结构/目录的流式JSON以及标题子树查询
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import orjson
+from fastapi.testclient import TestClient
+
+from api.db.base import Base
+from api.db.session import SessionLocal, engine
+from api.index import app
+from api.models.document import Document
+from api.models.document_node import DocumentNode, NodeType
+from api.models.processed_document import ProcessedDocument
+from api.services import document_structure_service as structure_module
+from api.services.document_structure_service import DocumentStructureService, document_structure_service
+
+SAMPLE_HTML = """<html><head><meta charset="utf-8"><title>t</title></head><body>
+<p>Intro</p>
+<h1>Chapter 1</h1>
+<p>Para 1</p>
+<p>Para <b>2</b></p>
+<h2>Section 1.1</h2>
+<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table>
+<img src="resources/image_1.png" alt="pic">
+<h2>Section 1.2</h2>
+<p>Para 3 – ü</p>
+<h1>Chapter 2</h1>
+<ul><li>item</li></ul>
+</body></html>"""
+
+
+class TestParseHtml(unittest.TestCase):
+    """测试基于lxml的HTML解析和文本节点合并"""
+
+    def test_node_types_and_hierarchy(self):
+        nodes = document_structure_service._parse_html_to_nodes(SAMPLE_HTML.encode("utf-8"))
+        summary = [(node.node_type, node.parent_id, node.depth) for node in nodes]
+        self.assertEqual(summary, [
+            (NodeType.TEXT, None, 0),
+            (NodeType.HEADER, None, 0),
+            (NodeType.TEXT, 1, 1),
+            (NodeType.HEADER, 1, 1),
+            (NodeType.TABLE, 3, 2),
+            (NodeType.IMAGE, 3, 2),
+            (NodeType.HEADER, 1, 1),
+            (NodeType.TEXT, 6, 2),
+            (NodeType.HEADER, None, 0),
+            (NodeType.TEXT, 8, 1),
+        ])
+        self.assertEqual([node.temp_id for node in nodes], list(range(len(nodes))))
+
+    def test_node_contents(self):
+        nodes = document_structure_service._parse_html_to_nodes(SAMPLE_HTML.encode("utf-8"))
+        self.assertEqual(nodes[1].content, "Chapter 1")
+        self.assertEqual(nodes[1].node_metadata, {"level": 1})
+        # 同一标题下连续的段落合并为一个节点，保留内联标签
+        self.assertEqual(nodes[2].node_metadata["count"], 2)
+        self.assertIn("<p>Para <b>2</b></p>", nodes[2].content)
+        self.assertEqual(nodes[4].node_metadata, {"rows": 2, "cols": 2})
+        self.assertEqual(nodes[5].node_metadata, {"src": "resources/image_1.png", "alt": "pic"})
+        # 字节按UTF-8解析，非ASCII字符不会乱码
+        self.assertIn("Para 3 – ü", nodes[7].content)
+
+    def test_str_and_bytes_give_same_nodes(self):
+        self.assertEqual(
+            document_structure_service._parse_html_to_nodes(SAMPLE_HTML),
+            document_structure_service._parse_html_to_nodes(SAMPLE_HTML.encode("utf-8")),
+        )
+
+    def test_empty_document(self):
+        self.assertEqual(document_structure_service._parse_html_to_nodes(b"  "), [])
+
+
+class StructureDbTestCase(unittest.TestCase):
+    """每个测试使用一套新建的表，并准备好一个已转换完成的HTML处理文档"""
+
+    def setUp(self):
+        Base.metadata.create_all(engine)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = SessionLocal()
+        self.processed_document_id = self.add_processed_document(SAMPLE_HTML)
+
+    def tearDown(self):
+        self.db.close()
+        self.temp_dir.cleanup()
+        Base.metadata.drop_all(engine)
+
+    def add_processed_document(self, html: str) -> int:
+        html_path = Path(self.temp_dir.name) / f"doc_{len(list(Path(self.temp_dir.name).iterdir()))}.html"
+        html_path.write_text(html, encoding="utf-8")
+        document = Document(filename=html_path.name, filepath=str(html_path), filesize=len(html))
+        processed_document = ProcessedDocument(original_document=document, format="html", file_path=str(html_path))
+        self.db.add(processed_document)
+        self.db.commit()
+        return processed_document.id
+
+    def structure(self, processed_document_id: int) -> list[DocumentNode]:
+        processed_document = self.db.get(ProcessedDocument, processed_document_id)
+        return document_structure_service.process_html_document(self.db, processed_document)
+
+    def headers(self, processed_document_id: int) -> list[DocumentNode]:
+        return self.db.query(DocumentNode).filter(
+            DocumentNode.processed_document_id == processed_document_id,
+            DocumentNode.node_type == NodeType.HEADER,
+        ).order_by(DocumentNode.position).all()
+
+
+def _tree_contents(tree: list) -> list:
+    """树形JSON中每个节点的 (content, 子节点) 嵌套列表"""
+    return [(item["data"]["content"], _tree_contents(item["children"])) for item in tree]
+
+
+class TestSaveNodes(StructureDbTestCase):
+    """测试节点保存的两种方式：预先分配ID（PostgreSQL）和插入后批量更新父节点（其他数据库）"""
+
+    def save_and_check(self) -> list[DocumentNode]:
+        nodes_data = document_structure_service._parse_html_to_nodes(SAMPLE_HTML)
+        db_nodes = document_structure_service._save_nodes_to_db(self.db, self.processed_document_id, nodes_data)
+        self.assertEqual(len(db_nodes), len(nodes_data))
+
+        # 重新从数据库读取，确认父子关系已经写入而不只是内存中的值
+        self.db.expire_all()
+        stored = {node.id: node for node in self.db.query(DocumentNode).all()}
+        self.assertEqual(len(stored), len(nodes_data))
+        for node_data, db_node in zip(nodes_data, db_nodes):
+            node = stored[db_node.id]
+            self.assertEqual(node.processed_document_id, self.processed_document_id)
+            self.assertEqual(node.node_type, node_data.node_type)
+            self.assertEqual(node.content, node_data.content)
+            self.assertEqual(node.position, node_data.position)
+            self.assertEqual(node.depth, node_data.depth)
+            expected_parent = None if node_data.parent_id is None else db_nodes[node_data.parent_id].id
+            self.assertEqual(node.parent_id, expected_parent)
+        return db_nodes
+
+    def test_insert_then_update_parents(self):
+        # SQLite不支持序列，走插入后批量更新parent_id的方式
+        self.assertIsNone(DocumentStructureService._preallocate_node_ids(self.db, 3))
+        self.save_and_check()
+
+    def test_preallocated_ids(self):
+        preallocated = list(range(1001, 1011))
+        with mock.patch.object(
+            DocumentStructureService, "_preallocate_node_ids", return_value=preallocated
+        ) as preallocate:
+            db_nodes = self.save_and_check()
+        preallocate.assert_called_once_with(self.db, 10)
+        self.assertEqual([node.id for node in db_nodes], preallocated)
+
+    def test_no_nodes(self):
+        self.assertEqual(document_structure_service._save_nodes_to_db(self.db, self.processed_document_id, []), [])
+
+
+class TestStructureStreaming(StructureDbTestCase):
+    """测试文档结构和目录的流式JSON输出"""
+
+    def test_structure_json(self):
+        nodes = self.structure(self.processed_document_id)
+        body = b"".join(document_structure_service.iter_document_structure_json(
+            self.db, self.processed_document_id, original_document_id=1
+        ))
+        result = orjson.loads(body)
+        self.assertEqual(result["processed_document_id"], self.processed_document_id)
+        self.assertEqual(result["original_document_id"], 1)
+
+        tree = result["structure"]
+        self.assertEqual([item["data"]["node_type"] for item in tree], ["text", "header", "header"])
+        chapter_1 = tree[1]
+        self.assertEqual(chapter_1["data"]["id"], nodes[1].id)
+        self.assertEqual(
+            [child["data"]["content"] for child in chapter_1["children"][1:]], ["Section 1.1", "Section 1.2"]
+        )
+        section_1_1 = chapter_1["children"][1]
+        self.assertEqual(
+            [child["data"]["node_type"] for child in section_1_1["children"]], ["table", "image"]
+        )
+        self.assertEqual(len(tree[2]["children"]), 1)
+
+    def test_structure_json_in_small_chunks(self):
+        self.structure(self.processed_document_id)
+        full = b"".join(document_structure_service.iter_document_structure_json(
+            self.db, self.processed_document_id, original_document_id=1
+        ))
+        with mock.patch.object(structure_module, "STREAM_CHUNK_SIZE", 16):
+            chunks = list(document_structure_service.iter_document_structure_json(
+                self.db, self.processed_document_id, original_document_id=1
+            ))
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(b"".join(chunks), full)
+
+    def test_toc_json(self):
+        self.structure(self.processed_document_id)
+        body = b"".join(document_structure_service.iter_document_toc_json(
+            self.db, self.processed_document_id, original_document_id=1
+        ))
+        toc = orjson.loads(body)["toc"]
+        self.assertEqual(_tree_contents(toc), [
+            ("Chapter 1", [("Section 1.1", []), ("Section 1.2", [])]),
+            ("Chapter 2", []),
+        ])
+        self.assertEqual(set(toc[0]["data"]), {"id", "content", "parent_id", "node_metadata"})
+
+    def test_empty_structure_json(self):
+        body = b"".join(document_structure_service.iter_document_structure_json(
+            self.db, self.processed_document_id, original_document_id=1
+        ))
+        self.assertEqual(orjson.loads(body)["structure"], [])
+
+
+class TestHeaderSubtrees(StructureDbTestCase):
+    """测试标题子树的单个查询和批量查询"""
+
+    def test_header_subtree(self):
+        nodes = self.structure(self.processed_document_id)
+        subtree = document_structure_service.get_header_subtree(self.db, nodes[3].id)
+        self.assertEqual([node.id for node in subtree], [nodes[3].id, nodes[4].id, nodes[5].id])
+
+        chapter_1 = document_structure_service.get_header_subtree(self.db, nodes[1].id)
+        self.assertEqual([node.id for node in chapter_1], [node.id for node in nodes[1:8]])
+
+        # 非标题节点没有子树
+        self.assertEqual(document_structure_service.get_header_subtree(self.db, nodes[0].id), [])
+
+    def test_bulk_matches_single_queries(self):
+        self.structure(self.processed_document_id)
+        other_id = self.add_processed_document(
+            "<html><body><h1>A</h1><p>a</p><h2>B</h2><p>b</p><h1>C</h1></body></html>"
+        )
+        self.structure(other_id)
+
+        headers = self.headers(self.processed_document_id) + self.headers(other_id)
+        bulk = document_structure_service.get_header_subtrees_bulk(self.db, headers)
+        self.assertEqual(set(bulk), {header.id for header in headers})
+        for header in headers:
+            expected = document_structure_service.get_header_subtree(self.db, header.id)
+            self.assertEqual([node.id for node in bulk[header.id]], [node.id for node in expected])
+
+    def test_bulk_without_headers(self):
+        self.assertEqual(document_structure_service.get_header_subtrees_bulk(self.db, []), {})
+
+
+class TestStructureEndpoints(StructureDbTestCase):
+    """测试结构化相关的API端点"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = TestClient(app)
+
+    def test_structure_then_read(self):
+        response = self.client.post(f"/documents/processed/{self.processed_document_id}/structured")
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(f"/documents/processed/{self.processed_document_id}/structure")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["structure"]), 3)
+
+        response = self.client.get(f"/documents/processed/{self.processed_document_id}/toc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["data"]["content"] for item in response.json()["toc"]], ["Chapter 1", "Chapter 2"])
+
+        header_id = response.json()["toc"][0]["children"][0]["data"]["id"]
+        response = self.client.get(f"/documents/nodes/{header_id}/content")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["node"]["content"], "Section 1.1")
+        self.assertEqual([child["node_type"] for child in response.json()["children"]], ["table", "image"])
+
+    def test_missing_processed_document(self):
+        self.assertEqual(self.client.get("/documents/processed/9999/structure").status_code, 404)
+        self.assertEqual(self.client.get("/documents/processed/9999/toc").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
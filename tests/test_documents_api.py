@@ -0,0 +1,319 @@
+"""
+测试文档列表等API端点，使用临时SQLite数据库
+"""
+import json
+import tempfile
+import unittest
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from api.core.process_pool import call_by_path
+from api.db.base import Base
+from api.db.session import SessionLocal, engine
+from api.endpoints import documents as documents_endpoints
+from api.index import app
+from api.models.document import Document
+from api.models.document_node import DocumentNode, NodeType
+from api.models.processed_document import ProcessedDocument, ProcessingStatus
+from api.services import document_service
+
+
+class DocumentsApiTestCase(unittest.TestCase):
+    """每个测试使用一套新建的表，测试结束后删除"""
+
+    def setUp(self):
+        Base.metadata.create_all(engine)
+        document_service.invalidate_document_count_estimate()
+        self.client = TestClient(app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        Base.metadata.drop_all(engine)
+
+    def add_documents(self, count: int, suffix: str = ".docx") -> list[int]:
+        """按id递增插入count个文档，created_at随id递增，返回插入的id"""
+        base_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        with SessionLocal() as db:
+            documents = [
+                Document(
+                    filename=f"doc_{i}{suffix}",
+                    filepath=f"storage/uploads/{uuid.uuid4().hex}_doc_{i}{suffix}",
+                    filesize=100 + i,
+                    created_by="tester",
+                    created_at=base_time + timedelta(minutes=i),
+                )
+                for i in range(count)
+            ]
+            db.add_all(documents)
+            db.commit()
+            return [document.id for document in documents]
+
+
+class TestListDocuments(DocumentsApiTestCase):
+    """测试文档列表的键集分页"""
+
+    def read_all_pages(self, limit: int, **params) -> list[int]:
+        ids = []
+        cursor_id = None
+        while True:
+            query = {"limit": limit, **params}
+            if cursor_id is not None:
+                query["cursor_id"] = cursor_id
+            response = self.client.get("/documents/", params=query)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            ids.extend(item["id"] for item in page["items"])
+            if not page["has_next"]:
+                self.assertIsNone(page["next_cursor_id"])
+                return ids
+            self.assertEqual(page["next_cursor_id"], page["items"][-1]["id"])
+            cursor_id = page["next_cursor_id"]
+
+    def test_descending_pages(self):
+        ids = self.add_documents(5)
+        self.assertEqual(self.read_all_pages(2), list(reversed(ids)))
+
+    def test_ascending_pages(self):
+        ids = self.add_documents(5)
+        self.assertEqual(self.read_all_pages(2, sort_desc=False), ids)
+
+    def test_pages_sorted_by_other_field(self):
+        ids = self.add_documents(5)
+        self.assertEqual(self.read_all_pages(3, sort_by="filesize", sort_desc=False), ids)
+
+    def test_first_page_next_cursor(self):
+        ids = self.add_documents(3)
+        page = self.client.get("/documents/", params={"limit": 2}).json()
+        self.assertEqual([item["id"] for item in page["items"]], [ids[2], ids[1]])
+        self.assertTrue(page["has_next"])
+        self.assertEqual(page["next_cursor_id"], ids[1])
+
+    def test_invalid_cursor(self):
+        self.add_documents(3)
+        response = self.client.get("/documents/", params={"cursor_id": 9999})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestDocumentCounts(DocumentsApiTestCase):
+    """测试列表接口的精确计数和估算计数"""
+
+    def test_exact_count_first_page(self):
+        self.add_documents(5)
+        page = self.client.get("/documents/", params={"limit": 2, "count_mode": "exact"}).json()
+        self.assertEqual(page["total"], 5)
+        self.assertEqual(len(page["items"]), 2)
+
+    def test_exact_count_from_cursor(self):
+        ids = self.add_documents(5)
+        page = self.client.get(
+            "/documents/", params={"limit": 2, "count_mode": "exact", "cursor_id": ids[3]}
+        ).json()
+        # 精确计数统计的是游标之后的行
+        self.assertEqual(page["total"], 3)
+
+    def test_estimated_count(self):
+        self.add_documents(4)
+        page = self.client.get("/documents/", params={"limit": 1, "count_mode": "estimate"}).json()
+        # SQLite没有规划器统计信息，估算退回精确计数
+        self.assertEqual(page["total"], 4)
+
+    def test_no_count_by_default(self):
+        self.add_documents(2)
+        self.assertIsNone(self.client.get("/documents/").json()["total"])
+
+
+class TestExportDocuments(DocumentsApiTestCase):
+    """测试NDJSON导出"""
+
+    def test_export_all_documents_as_ndjson(self):
+        ids = self.add_documents(3)
+        with SessionLocal() as db:
+            db.add(ProcessedDocument(original_document_id=ids[0], format="html", file_path="out.html"))
+            db.commit()
+
+        response = self.client.get("/documents/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = response.content.splitlines()
+        documents = [json.loads(line) for line in lines]
+        self.assertEqual([document["id"] for document in documents], ids)
+        self.assertEqual(len(documents[0]["processed_documents"]), 1)
+        self.assertEqual(documents[1]["processed_documents"], [])
+
+    def test_export_empty(self):
+        response = self.client.get("/documents/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+
+
+class TestProcessDocument(DocumentsApiTestCase):
+    """测试后台转换：请求立即返回202，转换结果写回处理文档记录"""
+
+    def setUp(self):
+        super().setUp()
+        # 用线程池代替进程池，转换函数可以在测试中替换
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.client.app.state.convert_pool = self.pool
+
+    def tearDown(self):
+        self.pool.shutdown()
+        super().tearDown()
+
+    def process(self, document_id: int):
+        response = self.client.post(f"/documents/{document_id}/process")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], ProcessingStatus.PENDING.value)
+        self.assertIsNone(response.json()["file_path"])
+        # TestClient在返回响应前执行完后台任务
+        return self.client.get(f"/documents/processed/{response.json()['id']}").json()
+
+    def test_background_conversion_completes(self):
+        document_id = self.add_documents(1, suffix=".pdf")[0]
+        with mock.patch(
+            "api.services.document_processing_service.convert_document",
+            return_value=("out/doc.html", "out/resources"),
+        ) as convert:
+            processed = self.process(document_id)
+        convert.assert_called_once()
+        self.assertEqual(processed["status"], ProcessingStatus.COMPLETED.value)
+        self.assertEqual(processed["file_path"], "out/doc.html")
+        self.assertEqual(processed["resources_path"], "out/resources")
+
+    def test_background_conversion_fails(self):
+        document_id = self.add_documents(1, suffix=".pdf")[0]
+        with mock.patch(
+            "api.services.document_processing_service.convert_document",
+            side_effect=RuntimeError("conversion failed"),
+        ):
+            processed = self.process(document_id)
+        self.assertEqual(processed["status"], ProcessingStatus.FAILED.value)
+        self.assertEqual(processed["error_message"], "conversion failed")
+        self.assertIsNone(processed["file_path"])
+
+    def test_task_is_submitted_by_module_path(self):
+        # 提交给进程池的是模块路径，主进程不需要导入文档转换模块
+        document_id = self.add_documents(1, suffix=".pdf")[0]
+        with mock.patch.object(self.pool, "submit", wraps=self.pool.submit) as submit, mock.patch(
+            "api.services.document_processing_service.convert_document",
+            return_value=("out/doc.html", "out/resources"),
+        ):
+            processed = self.process(document_id)
+        submit.assert_called_once_with(call_by_path, documents_endpoints.CONVERT_DOCUMENT_TASK, mock.ANY)
+        self.assertEqual(processed["status"], ProcessingStatus.COMPLETED.value)
+
+    def test_unsupported_format_is_rejected(self):
+        document_id = self.add_documents(1, suffix=".xyz")[0]
+        response = self.client.post(f"/documents/{document_id}/process")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/documents/{document_id}/processed").json(), [])
+
+    def test_missing_document(self):
+        self.assertEqual(self.client.post("/documents/9999/process").status_code, 404)
+
+
+class TestDeleteProcessedDocument(DocumentsApiTestCase):
+    """测试删除处理文档：数据库记录、结构节点和物理文件一起删除"""
+
+    def test_delete_with_nodes_and_files(self):
+        document_id = self.add_documents(1)[0]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            doc_dir = Path(temp_dir) / "doc"
+            resources_dir = doc_dir / "resources"
+            resources_dir.mkdir(parents=True)
+            (resources_dir / "image_1.png").write_bytes(b"png")
+            html_file = doc_dir / "doc.html"
+            html_file.write_text("<html></html>")
+
+            with SessionLocal() as db:
+                processed = ProcessedDocument(
+                    original_document_id=document_id, format="html",
+                    file_path=str(html_file), resources_path=str(resources_dir),
+                )
+                processed.nodes = [
+                    DocumentNode(node_type=NodeType.HEADER, content="Title", position=0, depth=0),
+                    DocumentNode(node_type=NodeType.TEXT, content="<p>a</p>", position=1, depth=1),
+                ]
+                db.add(processed)
+                db.commit()
+                processed_id = processed.id
+
+            response = self.client.delete(f"/documents/processed/{processed_id}")
+            self.assertEqual(response.status_code, 204)
+            with SessionLocal() as db:
+                self.assertIsNone(db.get(ProcessedDocument, processed_id))
+                self.assertEqual(db.query(DocumentNode).count(), 0)
+                self.assertIsNotNone(db.get(Document, document_id))
+            self.assertFalse(doc_dir.exists())
+
+        self.assertEqual(self.client.delete(f"/documents/processed/{processed_id}").status_code, 404)
+
+
+class TestListEtag(DocumentsApiTestCase):
+    """测试列表接口的ETag和304响应"""
+
+    def test_unchanged_list_returns_304(self):
+        self.add_documents(2)
+        response = self.client.get("/documents/", params={"limit": 1})
+        etag = response.headers["etag"]
+        self.assertIn("max-age", response.headers["cache-control"])
+
+        response = self.client.get("/documents/", params={"limit": 1}, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["etag"], etag)
+
+    def test_etag_depends_on_query(self):
+        self.add_documents(2)
+        etag = self.client.get("/documents/", params={"limit": 1}).headers["etag"]
+        response = self.client.get("/documents/", params={"limit": 2}, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_when_documents_change(self):
+        self.add_documents(2)
+        etag = self.client.get("/documents/").headers["etag"]
+        self.add_documents(1)
+        response = self.client.get("/documents/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 3)
+
+    def test_etag_changes_when_highest_id_is_reused(self):
+        ids = self.add_documents(2)
+        etag = self.client.get("/documents/").headers["etag"]
+        with SessionLocal() as db:
+            db.delete(db.get(Document, ids[-1]))
+            db.commit()
+        # SQLite会复用被删除的最大rowid，文档数量和最大id都与之前相同，但内容不同
+        self.assertEqual(self.add_documents(1, suffix=".pdf"), [ids[-1]])
+        response = self.client.get("/documents/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["items"][0]["filename"].endswith(".pdf"))
+
+    def test_processed_list_etag_follows_status(self):
+        document_id = self.add_documents(1)[0]
+        with SessionLocal() as db:
+            processed = ProcessedDocument(
+                original_document_id=document_id, format="html", status=ProcessingStatus.PENDING.value
+            )
+            db.add(processed)
+            db.commit()
+            processed_id = processed.id
+
+        url = f"/documents/{document_id}/processed"
+        etag = self.client.get(url).headers["etag"]
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+        with SessionLocal() as db:
+            document_service.fail_processed_document(db, processed_id, error_message="boom")
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["status"], ProcessingStatus.FAILED.value)
+
+
+if __name__ == "__main__":
+    unittest.main()
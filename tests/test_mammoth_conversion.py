@@ -0,0 +1,248 @@
+"""
+测试Mammoth DOCX转HTML：图片提取、src改写和转换结果缓存
+"""
+import base64
+import binascii
+import io
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+from unittest import mock
+
+from docx import Document as DocxDocument
+
+from api.services import mammoth_document_service
+from api.services.mammoth_document_service import DocxToHTMLConverter
+
+
+def _png_bytes(width: int = 2, height: int = 2, rgb: tuple = (255, 0, 0)) -> bytes:
+    """生成一张纯色PNG图片"""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+class MammothTestCase(unittest.TestCase):
+    """每个测试使用独立的处理目录和缓存目录"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.converter = DocxToHTMLConverter()
+        self.converter.processed_dir = self.root / "processed"
+        self.converter.cache_dir = self.converter.processed_dir / "_cache"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_docx(self, name: str, text: str = "Hello", images: int = 1) -> Path:
+        """生成包含一段文字和若干张不同图片的DOCX文件"""
+        image_path = self.root / "image.png"
+        document = DocxDocument()
+        document.add_heading("Title", level=1)
+        document.add_paragraph(text)
+        for i in range(images):
+            image_path.write_bytes(_png_bytes(rgb=(i * 40 % 256, 0, 0)))
+            document.add_picture(str(image_path))
+        docx_path = self.root / name
+        document.save(str(docx_path))
+        return docx_path
+
+
+class TestDocxConversion(MammothTestCase):
+    """测试转换结果和图片src改写"""
+
+    def test_images_are_extracted_and_src_rewritten(self):
+        docx_path = self.make_docx("sample.docx", images=2)
+        html_file, resources_dir = self.converter.convert_file(str(docx_path))
+
+        html = Path(html_file).read_text(encoding="utf-8")
+        self.assertTrue(html.startswith("<!DOCTYPE html>"))
+        self.assertTrue(html.endswith("</body></html>"))
+        self.assertIn("<h1>Title</h1>", html)
+        self.assertNotIn("data:image", html)
+        self.assertIn('src="resources/image_1.png"', html)
+        self.assertIn('src="resources/image_2.png"', html)
+        self.assertEqual(
+            sorted(path.name for path in Path(resources_dir).iterdir()), ["image_1.png", "image_2.png"]
+        )
+        self.assertEqual(Path(resources_dir, "image_1.png").read_bytes()[:8], b"\x89PNG\r\n\x1a\n")
+
+    def test_repeated_image_is_written_once(self):
+        docx_path = self.make_docx("sample.docx")
+        document = DocxDocument(str(docx_path))
+        document.add_picture(str(self.root / "image.png"))
+        document.save(str(docx_path))
+
+        html_file, resources_dir = self.converter.convert_file(str(docx_path))
+        html = Path(html_file).read_text(encoding="utf-8")
+        self.assertEqual(html.count('src="resources/image_1.png"'), 2)
+        self.assertEqual([path.name for path in Path(resources_dir).iterdir()], ["image_1.png"])
+
+    def test_output_dir(self):
+        docx_path = self.make_docx("sample.docx")
+        html_file, resources_dir = self.converter.convert_file(str(docx_path), str(self.root / "out"))
+        self.assertEqual(Path(html_file).parent.parent, self.root / "out")
+        self.assertEqual(Path(resources_dir).parent, Path(html_file).parent)
+        self.assertEqual(Path(html_file).name, "sample.html")
+
+    def test_rejects_other_formats(self):
+        other = self.root / "sample.txt"
+        other.write_text("x")
+        with self.assertRaises(ValueError):
+            self.converter.convert_file(str(other))
+        with self.assertRaises(FileNotFoundError):
+            self.converter.convert_file(str(self.root / "missing.docx"))
+
+
+class TestImageExtraction(MammothTestCase):
+    """测试base64图片写入失败时不留下不完整的文件，也不占用图片编号"""
+
+    def test_failed_image_leaves_no_partial_file(self):
+        resources_dir = self.root / "resources"
+        resources_dir.mkdir()
+        png = base64.b64encode(_png_bytes()).decode()
+        # 第一块可以正常解码，第二块长度不完整，解码在写入部分内容后失败
+        broken = "data:image/png;base64,AAAAA"
+        html = f'<p><img src="{broken}" /><img src="data:image/png;base64,{png}" /></p>'
+
+        out = io.StringIO()
+        with mock.patch.object(mammoth_document_service, "BASE64_DECODE_CHUNK_SIZE", 4):
+            self.converter._extract_base64_images(html, resources_dir, out)
+
+        self.assertEqual([path.name for path in resources_dir.iterdir()], ["image_1.png"])
+        self.assertEqual((resources_dir / "image_1.png").read_bytes(), _png_bytes())
+        # 失败的图片保留原来的src，下一张图片仍然使用编号1
+        self.assertIn(f'src="{broken}"', out.getvalue())
+        self.assertIn('src="resources/image_1.png"', out.getvalue())
+
+    def test_failed_write_keeps_existing_file(self):
+        output_path = self.root / "image_1.png"
+        output_path.write_bytes(b"old")
+        with mock.patch.object(mammoth_document_service, "BASE64_DECODE_CHUNK_SIZE", 4):
+            with self.assertRaises(binascii.Error):
+                mammoth_document_service._write_base64_file("AAAAA", output_path)
+        self.assertEqual(output_path.read_bytes(), b"old")
+        self.assertEqual([path.name for path in self.root.iterdir()], ["image_1.png"])
+
+
+class TestConversionCache(MammothTestCase):
+    """测试按内容缓存的转换结果"""
+
+    def test_same_content_reuses_cached_result(self):
+        first = self.make_docx("first.docx")
+        html_1, resources_1 = self.converter.convert_file(str(first))
+        self.assertEqual(len(list(self.converter.cache_dir.iterdir())), 1)
+
+        second = self.root / "second.docx"
+        second.write_bytes(first.read_bytes())
+        with mock.patch("mammoth.convert_to_html") as convert_to_html:
+            html_2, resources_2 = self.converter.convert_file(str(second))
+        convert_to_html.assert_not_called()
+
+        # 命中缓存：输出位于新的目录，按新文件名命名，内容相同
+        self.assertNotEqual(Path(html_1).parent, Path(html_2).parent)
+        self.assertEqual(Path(html_2).name, "second.html")
+        self.assertEqual(Path(html_2).read_bytes(), Path(html_1).read_bytes())
+        self.assertEqual(
+            sorted(path.name for path in Path(resources_2).iterdir()),
+            sorted(path.name for path in Path(resources_1).iterdir()),
+        )
+        self.assertEqual(len(list(self.converter.cache_dir.iterdir())), 1)
+
+    def test_different_content_is_converted_again(self):
+        self.converter.convert_file(str(self.make_docx("first.docx", text="one")))
+        html_file, _ = self.converter.convert_file(str(self.make_docx("second.docx", text="two")))
+        self.assertIn("two", Path(html_file).read_text(encoding="utf-8"))
+        self.assertEqual(len(list(self.converter.cache_dir.iterdir())), 2)
+
+    def test_mammoth_version_is_part_of_key(self):
+        docx_path = self.make_docx("sample.docx")
+        self.converter.convert_file(str(docx_path))
+        with mock.patch.object(mammoth_document_service, "MAMMOTH_VERSION", "0.0.0"):
+            with mock.patch("mammoth.convert_to_html", wraps=mammoth_document_service.mammoth.convert_to_html) as convert:
+                self.converter.convert_file(str(docx_path))
+        convert.assert_called_once()
+        self.assertEqual(len(list(self.converter.cache_dir.iterdir())), 2)
+
+    def test_convert_options_are_part_of_key(self):
+        docx_path = self.make_docx("sample.docx")
+        self.converter.convert_file(str(docx_path))
+        self.converter.convert_options = {"style_map": "p[style-name='Heading 1'] => h2:fresh"}
+        html_file, _ = self.converter.convert_file(str(docx_path))
+        self.assertIn("<h2>Title</h2>", Path(html_file).read_text(encoding="utf-8"))
+        self.assertEqual(len(list(self.converter.cache_dir.iterdir())), 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.converter.cache_max_entries = 2
+        first, second, third = (self.make_docx(f"{name}.docx", text=name) for name in ("one", "two", "three"))
+        self.converter.convert_file(str(first))
+        self.converter.convert_file(str(second))
+        first_key = self.converter._cache_key(first.read_bytes())
+        second_key = self.converter._cache_key(second.read_bytes())
+        os.utime(self.converter.cache_dir / first_key, (1000, 1000))
+        os.utime(self.converter.cache_dir / second_key, (2000, 2000))
+
+        # 命中缓存后first成为最近使用的条目，新增条目时淘汰second
+        self.converter.convert_file(str(first))
+        self.converter.convert_file(str(third))
+        self.assertEqual(
+            sorted(path.name for path in self.converter.cache_dir.iterdir()),
+            sorted([first_key, self.converter._cache_key(third.read_bytes())]),
+        )
+
+    def test_cache_disabled(self):
+        self.converter.cache_max_entries = 0
+        html_file, _ = self.converter.convert_file(str(self.make_docx("sample.docx")))
+        self.assertTrue(Path(html_file).is_file())
+        self.assertFalse(self.converter.cache_dir.exists())
+
+    def test_failed_cache_write_leaves_no_entry(self):
+        link_or_copy = mammoth_document_service._link_or_copy
+
+        def fail_on_html(src, dst):
+            if Path(dst).name == mammoth_document_service.CACHED_HTML_NAME:
+                raise OSError("disk full")
+            return link_or_copy(src, dst)
+
+        docx_path = self.make_docx("sample.docx")
+        with mock.patch.object(mammoth_document_service, "_link_or_copy", side_effect=fail_on_html):
+            html_file, resources_dir = self.converter.convert_file(str(docx_path))
+
+        # 资源已复制到临时目录后失败：本次转换结果完整，缓存目录中不留下任何内容
+        self.assertIn("<h1>Title</h1>", Path(html_file).read_text(encoding="utf-8"))
+        self.assertEqual([path.name for path in Path(resources_dir).iterdir()], ["image_1.png"])
+        self.assertEqual(list(self.converter.cache_dir.iterdir()), [])
+
+        # 下次转换不会命中不完整的缓存项，重新转换并写入缓存
+        with mock.patch("mammoth.convert_to_html", wraps=mammoth_document_service.mammoth.convert_to_html) as convert:
+            self.converter.convert_file(str(docx_path))
+        convert.assert_called_once()
+        self.assertEqual(len(list(self.converter.cache_dir.iterdir())), 1)
+
+    def test_failed_cache_read_converts_again(self):
+        docx_path = self.make_docx("sample.docx")
+        self.converter.convert_file(str(docx_path))
+        cached_dir = next(self.converter.cache_dir.iterdir())
+        (cached_dir / mammoth_document_service.CACHED_HTML_NAME).unlink()
+
+        html_file, resources_dir = self.converter.convert_file(str(docx_path))
+        self.assertIn("<h1>Title</h1>", Path(html_file).read_text(encoding="utf-8"))
+        self.assertEqual([path.name for path in Path(resources_dir).iterdir()], ["image_1.png"])
+        # 损坏的缓存项被删除，并由本次转换的结果重新写入
+        self.assertEqual(list(self.converter.cache_dir.iterdir()), [cached_dir])
+        self.assertTrue((cached_dir / mammoth_document_service.CACHED_HTML_NAME).is_file())
+
+
+if __name__ == "__main__":
+    unittest.main()